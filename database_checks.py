@@ -0,0 +1,654 @@
+#Checks of the pin database, each run against a scratch database in a temporary directory
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+#Typing, logging
+import logging
+#Timing functions
+import time
+
+from fuzzywuzzy import fuzz
+
+logger = logging.getLogger('database_checks')
+
+#Words real common names are built from, so generated names share letters and bigrams the way real ones do
+NAME_ADJECTIVES: tuple[str, ...] = ('Common', 'Lesser', 'Greater', 'Little', 'Grey', 'Black', 'White', 'Red', 'Yellow',
+                                    'Blue', 'Green', 'Brown', 'Rufous', 'Chestnut', 'Olive', 'Spotted', 'Striped', 'Barred',
+                                    'Crested', 'Hooded', 'Collared', 'Masked', 'Scaly', 'Streaked', 'Plain', 'Pale', 'Dusky',
+                                    'Sooty', 'Golden', 'Scarlet', 'Crimson', 'Cinnamon', 'Tawny', 'Slaty', 'Mountain', 'Forest',
+                                    'Marsh', 'River', 'Island', 'Northern', 'Southern', 'Eastern', 'Western', 'African',
+                                    'Asian', 'American', 'Andean', 'Amazonian', 'Himalayan', 'Tropical', 'Pacific', 'Arctic',
+                                    'Javan', 'Bornean', 'Moluccan', 'Papuan', 'Hawaiian', 'Cuban', 'Mexican', 'Chilean')
+NAME_PARTS: tuple[str, ...] = ('headed', 'throated', 'breasted', 'bellied', 'backed', 'winged', 'tailed', 'billed',
+                               'capped', 'crowned', 'necked', 'eyed', 'browed', 'cheeked', 'fronted', 'rumped', 'vented')
+NAME_NOUNS: tuple[str, ...] = ('Pigeon', 'Dove', 'Parrot', 'Parakeet', 'Lorikeet', 'Owl', 'Hawk', 'Eagle', 'Falcon', 'Kite',
+                               'Heron', 'Egret', 'Ibis', 'Duck', 'Goose', 'Teal', 'Grebe', 'Gull', 'Tern', 'Plover',
+                               'Sandpiper', 'Rail', 'Crake', 'Quail', 'Partridge', 'Pheasant', 'Cuckoo', 'Coucal', 'Swift',
+                               'Hummingbird', 'Kingfisher', 'Bee-eater', 'Hornbill', 'Barbet', 'Toucan', 'Woodpecker',
+                               'Flycatcher', 'Warbler', 'Thrush', 'Robin', 'Wren', 'Sparrow', 'Finch', 'Bunting', 'Tanager',
+                               'Oriole', 'Starling', 'Crow', 'Jay', 'Shrike', 'Swallow', 'Lark', 'Pipit', 'Wagtail',
+                               'Babbler', 'Bulbul', 'White-eye', 'Sunbird', 'Honeyeater', 'Fantail', 'Monarch', 'Whistler',
+                               'Tit', 'Nuthatch', 'Antbird', 'Tyrannulet', 'Manakin', 'Spinetail', 'Seedeater', 'Weaver',
+                               'Munia', 'Fruit-Dove', 'Ground-Dove', 'Scops-Owl', 'Sparrowhawk')
+
+#The tables as the first release made them, before search keys, indexes and collection statistics
+BASELINE_SCHEMA: tuple[str, ...] = (
+    '''CREATE TABLE Bird(eBird_code TEXT NOT NULL PRIMARY KEY, common_name TEXT NOT NULL, family_common_name TEXT NOT NULL,
+                         bird_order TEXT NOT NULL, family TEXT NOT NULL, genus TEXT NOT NULL, species TEXT NOT NULL)''',
+    '''CREATE TABLE BirdSubspecies(eBird_code TEXT NOT NULL PRIMARY KEY, common_name TEXT NOT NULL, subspecies TEXT NOT NULL,
+                                   species TEXT NOT NULL, FOREIGN KEY(species) REFERENCES bird(eBird_code))''',
+    '''CREATE TABLE Supergroup(name TEXT NOT NULL PRIMARY KEY, short_name TEXT, description TEXT, website TEXT)''',
+    '''CREATE TABLE Source(name TEXT NOT NULL PRIMARY KEY, type TEXT NOT NULL, short_name TEXT, description TEXT,
+                           parent TEXT, website TEXT, FOREIGN KEY(parent) REFERENCES Supergroup(name))''',
+    '''CREATE TABLE Subgroup(name TEXT NOT NULL PRIMARY KEY, short_name TEXT, description TEXT, parent TEXT NOT NULL,
+                             website TEXT, FOREIGN KEY(parent) REFERENCES Source(name))''',
+    '''CREATE TABLE Pin(id INTEGER PRIMARY KEY AUTOINCREMENT, species TEXT NOT NULL, subspecies TEXT, source TEXT NOT NULL,
+                        subgroup TEXT, FOREIGN KEY(species) REFERENCES Bird(eBird_code),
+                        FOREIGN KEY(subspecies) REFERENCES BirdSubspecies(eBird_code),
+                        FOREIGN KEY(source) REFERENCES Source(name), FOREIGN KEY(subgroup) REFERENCES Subgroup(name))''')
+
+def realistic_taxonomy(species_count: int, seed: int = 0) -> list[dict]:
+    '''
+    eBird taxonomy entries named like real species, such as 'Rufous-throated Pigeon'. Fuzzy
+    matching rules out as many of these as of the real taxonomy, which it cannot do for the
+    numbered names of EBirdFixtures.synthetic.
+    >>> [species['comName'] for species in realistic_taxonomy(2)]
+    ['Crimson-eyed Thrush', 'Tawny Greater-capped Wagtail']
+    '''
+    random_state: random.Random = random.Random(seed)
+    names: set[str] = set()
+    while len(names) < species_count:
+        shape: float = random_state.random()
+        noun: str = random_state.choice(NAME_NOUNS)
+        compound: str = f'{random_state.choice(NAME_ADJECTIVES)}-{random_state.choice(NAME_PARTS)}'
+        if shape < 0.4:
+            names.add(f'{random_state.choice(NAME_ADJECTIVES)} {noun}')
+        elif shape < 0.8:
+            names.add(f'{compound} {noun}')
+        else:
+            names.add(f'{random_state.choice(NAME_ADJECTIVES)} {compound} {noun}')
+    taxonomy: list[dict] = []
+    for number, name in enumerate(sorted(names)):
+        family: int = number % 250
+        taxonomy.append({'sciName': f'Genus{number % 2300} epithet{number}',
+                         'comName': name,
+                         'speciesCode': f'rea{number:05d}',
+                         'category': 'species',
+                         'order': f'Order{family % 40}formes',
+                         'familyComName': f'Family {family}',
+                         'familySciName': f'Family{family}idae'})
+    return taxonomy
+
+def misspelt_prefixes(names: list[str], count: int, seed: int = 0) -> list[str]:
+    '''
+    `count` of names, each with a letter dropped, doubled or swapped for another and then cut
+    short, as if a user were still typing it.
+    >>> misspelt_prefixes(['Rock Pigeon'], 1)
+    ['rock pgeon']
+    '''
+    random_state: random.Random = random.Random(seed)
+    queries: list[str] = []
+    for name in random_state.sample(names, count):
+        letters: list[str] = list(name.lower())
+        position: int = random_state.randrange(len(letters))
+        edit: float = random_state.random()
+        if edit < 1 / 3:
+            del letters[position]
+        elif edit < 2 / 3:
+            letters.insert(position, letters[position])
+        else:
+            letters[position] = random_state.choice('abcdefghijklmnopqrstuvwxyz')
+        queries.append(''.join(letters[:random_state.randint(min(6, len(letters)), len(letters))]))
+    return queries
+
+def check_search_speedup(species_count: int = 11000, query_count: int = 8, threshold: int = 80,
+                         min_speedup: float = 10) -> dict[str, float]:
+    '''
+    Time fuzzy_search_species_ebird on the bigram engine against scoring every species with
+    partial_ratio, as searches did before the bigram index, over a taxonomy of the real size
+    and the default threshold. Returns the seconds per query of each, the speedup and the
+    species scored per query; raises AssertionError if the two find different species or the
+    speedup is under `min_speedup`.
+    >>> timings = check_search_speedup()
+    '''
+    from eBird_methods import UserLocalDBBridge, pinDatabaseFactory, database_pool, normalise_name, PinDatabaseInterface
+
+    taxonomy: list[dict] = realistic_taxonomy(species_count)
+    queries: list[str] = misspelt_prefixes([species['comName'] for species in taxonomy], query_count)
+    scan_seconds: float = 0
+    search_seconds: float = 0
+    candidates: int = 0
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        os.chdir(scratch_directory)
+        try:
+            database: PinDatabaseInterface = pinDatabaseFactory()
+            database.initialise_database()
+            database.update_ebird_data(taxonomy)
+            birds: list[dict] = database.bird_table.get_data()
+            bridge = UserLocalDBBridge(search_engine='bigram')
+            for query in queries:
+                search_name: str = normalise_name(query)
+                start: float = time.perf_counter()
+                expected: set[str] = {bird['eBird_code'] for bird in birds
+                                      if fuzz.partial_ratio(search_name, bird['search_name']) >= threshold}
+                scan_seconds += time.perf_counter() - start
+                start = time.perf_counter()
+                found: set[str] = {bird['eBird_code'] for bird, _ in bridge.fuzzy_search_species_ebird(query, threshold)}
+                search_seconds += time.perf_counter() - start
+                assert found == expected, f'{query!r} found {sorted(found ^ expected)} differently to a full scan'
+                candidates += len(bridge._species_candidates(query, threshold))
+            bridge.close_connection()
+        finally:
+            #Let go of the scratch database before its directory is removed
+            database_pool.close()
+            os.chdir(working_directory)
+    timings: dict[str, float] = {'full scan seconds per query': scan_seconds / query_count,
+                                 'indexed seconds per query': search_seconds / query_count,
+                                 'speedup': scan_seconds / search_seconds,
+                                 'candidates per query': candidates / query_count}
+    assert timings['speedup'] >= min_speedup, f'Indexed search is not {min_speedup} times faster: {timings}'
+    return timings
+
+def check_search_as_you_type(species_count: int = 2000, query_count: int = 12, threshold: int = 80, 
+                             limit: int = 10, wait: float = 10) -> dict[str, float]:
+    '''
+    Type misspelt names one letter at a time into a SpeciesSearchWorker, as the pin entry
+    screen does, and check the suggestions after every keystroke against a full partial_ratio
+    scan. Returns the keystrokes typed and the slowest search in seconds; raises AssertionError
+    on any difference, or if a search takes longer than `wait` seconds.
+    >>> timings = check_search_as_you_type()
+    '''
+    from eBird_methods import SpeciesSearchSession, SpeciesSearchWorker, pinDatabaseFactory, database_pool, normalise_name, PinDatabaseInterface
+
+    taxonomy: list[dict] = realistic_taxonomy(species_count)
+    queries: list[str] = misspelt_prefixes([species['comName'] for species in taxonomy], query_count)
+    keystrokes: int = 0
+    slowest: float = 0
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        os.chdir(scratch_directory)
+        worker = SpeciesSearchWorker(threshold=threshold, limit=limit)
+        try:
+            database: PinDatabaseInterface = pinDatabaseFactory()
+            database.initialise_database()
+            database.update_ebird_data(taxonomy)
+            birds: list[dict] = database.bird_table.get_data()
+            worker.start()
+            for query in queries:
+                for length in range(1, len(query) + 1):
+                    typed: str = query[:length]
+                    search_name: str = normalise_name(typed)
+                    expected: list[tuple[str, int]] = []
+                    if len(search_name) >= SpeciesSearchSession.MIN_QUERY_LENGTH:
+                        scores = ((bird['common_name'], fuzz.partial_ratio(search_name, bird['search_name'])) for bird in birds)
+                        expected = sorted((match for match in scores if match[1] >= threshold), 
+                                          key=lambda match: (-match[1], match[0]))[:limit]
+                    start: float = time.perf_counter()
+                    worker.submit(typed)
+                    result = worker.result()
+                    while result is None and time.perf_counter() - start < wait:
+                        time.sleep(0.001)
+                        result = worker.result()
+                    slowest = max(slowest, time.perf_counter() - start)
+                    assert result is not None, f'No suggestions for {typed!r} within {wait} seconds'
+                    found: list[tuple[str, int]] = [(bird['common_name'], score) for bird, score in result[1]]
+                    assert found == expected, f'{typed!r} suggested {found} rather than {expected}'
+                    keystrokes += 1
+        finally:
+            worker.stop()
+            database_pool.close()
+            os.chdir(working_directory)
+    return {'keystrokes': keystrokes, 'slowest search seconds': slowest}
+
+def check_baseline_upgrade(species_count: int = 200) -> dict[str, int]:
+    '''
+    Open a database in the first release's schema the way the app does, through
+    prepare_database, then search it and count its pins straight away, before any taxonomy
+    update could have upgraded it. Returns the matches and pinned species found; raises
+    AssertionError if either is wrong.
+    >>> check_baseline_upgrade()
+    {'matches': 1, 'pinned species': 2}
+    '''
+    import sqlite3
+    from eBird_methods import UserLocalDBBridge, prepare_database, database_pool
+    from pin_database_schema import DATABASE
+
+    taxonomy: list[dict] = realistic_taxonomy(species_count)
+    pinned: list[dict] = taxonomy[:2]
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        os.chdir(scratch_directory)
+        try:
+            with sqlite3.connect(DATABASE) as connection:
+                for statement in BASELINE_SCHEMA:
+                    connection.execute(statement)
+                connection.executemany('INSERT INTO Bird VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                       [(species['speciesCode'], species['comName'], species['familyComName'], species['order'],
+                                         species['familySciName'], *species['sciName'].split()) for species in taxonomy])
+                connection.execute("INSERT INTO Source(name, type) VALUES ('Gift shop', 'Shop')")
+                connection.executemany("INSERT INTO Pin(species, source) VALUES (?, 'Gift shop')",
+                                       [(species['speciesCode'],) for species in pinned])
+            connection.close()
+            prepare_database()
+            bridge = UserLocalDBBridge()
+            matches: list = bridge.fuzzy_search_species_ebird(pinned[0]['comName'], threshold=100)
+            pin_counts: dict[str, int] = bridge.pin_counts('species')
+            bridge.close_connection()
+        finally:
+            #Let go of the scratch database before its directory is removed
+            database_pool.close()
+            os.chdir(working_directory)
+    assert any(bird['eBird_code'] == pinned[0]['speciesCode'] for bird, _ in matches), f'No match for {pinned[0]["comName"]}'
+    assert pin_counts == {species['speciesCode']: 1 for species in pinned}, f'Wrong pin counts {pin_counts}'
+    return {'matches': len(matches), 'pinned species': len(pin_counts)}
+
+def check_pin_entry(species_count: int = 200) -> dict[str, object]:
+    '''
+    Enter a pin the way the new pin screen does: search for a misspelt name, pick the best
+    match and one of its subspecies, then add_pin. Check the pin is counted by order and
+    family and survives a pin_transfer export and import into a second database. Also check
+    upgrade_schema points a pin stored by common name, as hand-entered pins once were, at its
+    eBird code. Returns the pin and the import report; raises AssertionError if any step fails.
+    >>> check_pin_entry()['import']
+    {'imported': 1, 'existing': 0, 'rejected': 0, 'errors': []}
+    '''
+    from eBird_methods import EBirdWeb, EBirdBridge, UserLocalDBBridge, pinDatabaseFactory, database_pool, search_keys, PinDatabaseInterface
+    from pin_transfer import PinTransfer, ImportReport
+
+    taxonomy: list[dict] = realistic_taxonomy(species_count)
+    picked: dict = taxonomy[species_count // 2]
+    legacy: dict = taxonomy[species_count // 3]
+    forms: list[dict] = [{'eBird_code': f'{picked["speciesCode"]}{suffix}', 'common_name': f'{picked["comName"]} ({suffix})',
+                          'subspecies': suffix, 'species': picked['speciesCode'],
+                          **search_keys(f'{picked["comName"]} ({suffix})')} for suffix in ('a', 'b')]
+
+    def load_database() -> PinDatabaseInterface:
+        database: PinDatabaseInterface = pinDatabaseFactory()
+        database.initialise_database()
+        database.update_ebird_data(taxonomy)
+        database.bird_subspecies_table.add_data(forms)
+        #Fetched just now, so retrieve_subspecies answers from the database without asking eBird
+        database.subspecies_fetch_table.replace_data([{'species': picked['speciesCode'], 'fetched_at': time.time()}])
+        database.source_table.add_data([{'name': 'Gift shop', 'type': 'Other', 'short_name': None,
+                                         'description': None, 'parent': None, 'website': None}])
+        return database
+
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        os.mkdir(os.path.join(scratch_directory, 'entered'))
+        os.mkdir(os.path.join(scratch_directory, 'imported'))
+        try:
+            os.chdir(os.path.join(scratch_directory, 'entered'))
+            database: PinDatabaseInterface = load_database()
+            bridge = UserLocalDBBridge()
+            species: dict = bridge.top_species_ebird(picked['comName'][:-1] + 'x', limit=1, phonetic=True)[0][0]
+            ebird_bridge = EBirdBridge(web=EBirdWeb())
+            subspecies: list[dict] = ebird_bridge.retrieve_subspecies(species['eBird_code'])
+            ebird_bridge.close_connection()
+            pin: dict = bridge.add_pin(species, subspecies[-1], 'Gift shop', None)
+            assert bridge.pin_counts('order') == {picked['order']: 1}, f'Pin not counted by order: {bridge.pin_counts("order")}'
+            coverage: list[dict] = [family for family in bridge.family_coverage() if family['pinned_species']]
+            assert [family['family'] for family in coverage] == [picked['familySciName']], f'Pin not counted by family: {coverage}'
+            database.pin_table.add_data([{'id': None, 'species': legacy['comName'], 'subspecies': None,
+                                          'source': 'Gift shop', 'subgroup': None}])
+            database.upgrade_schema()
+            legacy_pins: list[dict] = database.pin_table.query(where={'species': legacy['speciesCode']})
+            assert len(legacy_pins) == 1, f'Pin stored by name not moved to its code: {database.pin_table.get_data()}'
+            database.pin_table.delete_data([legacy_pins[0]['id']])
+            transfer = PinTransfer()
+            transfer.export_rows('Pin', os.path.join(scratch_directory, 'pins.csv'))
+            transfer.close_connection()
+            bridge.close_connection()
+            database_pool.close()
+            os.chdir(os.path.join(scratch_directory, 'imported'))
+            load_database()
+            transfer = PinTransfer()
+            report: ImportReport = transfer.import_rows('Pin', os.path.join(scratch_directory, 'pins.csv'))
+            transfer.close_connection()
+        finally:
+            #Let go of the scratch databases before their directory is removed
+            database_pool.close()
+            os.chdir(working_directory)
+    assert pin['species'] == picked['speciesCode'] and pin['subspecies'] == forms[-1]['eBird_code'], f'Pin not stored by code: {pin}'
+    assert report['imported'] == 1, f'Exported pin not imported: {report}'
+    return {'pin': pin, 'import': report}
+
+def check_cache_per_database(species_count: int = 200) -> dict[str, str]:
+    '''
+    Search two database files with different taxonomies, one after the other in the same
+    process, and check each search only sees its own file's species, as plain dicts. Returns
+    the species each file matched; raises AssertionError if one came from the other file.
+    >>> sorted(check_cache_per_database())
+    ['first', 'second']
+    '''
+    from eBird_methods import UserLocalDBBridge, pinDatabaseFactory, database_pool
+
+    #Codes are numbered, so only the second file has its last species
+    taxonomies: dict[str, list[dict]] = {'first': realistic_taxonomy(species_count, seed=1), 
+                                         'second': realistic_taxonomy(species_count * 2, seed=2)}
+    matched: dict[str, str] = {}
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        try:
+            for name, taxonomy in taxonomies.items():
+                os.mkdir(os.path.join(scratch_directory, name))
+                os.chdir(os.path.join(scratch_directory, name))
+                database = pinDatabaseFactory()
+                database.initialise_database()
+                database.update_ebird_data(taxonomy)
+                database_pool.release(database)
+            #Both loaded before either is searched, so the taxonomy generation no longer moves on
+            for name, taxonomy in taxonomies.items():
+                os.chdir(os.path.join(scratch_directory, name))
+                bridge = UserLocalDBBridge()
+                matches: list = bridge.top_species_ebird(taxonomy[-1]['comName'], limit=1)
+                bridge.close_connection()
+                assert matches, f'No match for {taxonomy[-1]["comName"]} in the {name} file'
+                bird: dict = matches[0][0]
+                assert type(bird) is dict, f'Search returned a {type(bird).__name__}, not a dict'
+                matched[name] = bird['eBird_code']
+        finally:
+            database_pool.close()
+            os.chdir(working_directory)
+    for name, taxonomy in taxonomies.items():
+        assert matched[name] == taxonomy[-1]['speciesCode'], f'{name} file matched {matched[name]} from another file'
+    return matched
+
+def check_ingestion_memory(species_counts: tuple[int, ...] = (1000, 8000), tolerance: float = 1.25) -> dict[int, int]:
+    '''
+    Stream synthetic taxonomies of each size from a file through update_ebird_data into an
+    empty database, under tracemalloc, and check the peak stays flat as the taxonomy grows.
+    Returns the peak bytes per size; raises AssertionError if the largest exceeds the smallest
+    by more than `tolerance` times. Runs in a temporary directory.
+    >>> peaks = check_ingestion_memory()
+    '''
+    import tracemalloc
+    from eBird_methods import iter_json_array, pinDatabaseFactory, database_pool, PinDatabaseInterface
+    from fake_ebird_server import EBirdFixtures
+
+    peaks: dict[int, int] = {}
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        try:
+            for species_count in species_counts:
+                os.chdir(scratch_directory)
+                os.mkdir(str(species_count))
+                os.chdir(str(species_count))
+                with open(EBirdFixtures.TAXONOMY_FILE, 'wb') as taxonomy_file:
+                    taxonomy_file.write(EBirdFixtures.synthetic(species_count, forms_per_species=0).taxonomy_body)
+                database: PinDatabaseInterface = pinDatabaseFactory()
+                database.initialise_database()
+                with open(EBirdFixtures.TAXONOMY_FILE, 'rb') as taxonomy_file:
+                    tracemalloc.start()
+                    try:
+                        database.update_ebird_data(iter_json_array(iter(lambda: taxonomy_file.read(64 * 1024), b'')))
+                        peaks[species_count] = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+                database_pool.close()
+        finally:
+            database_pool.close()
+            os.chdir(working_directory)
+    smallest: int = peaks[min(species_counts)]
+    largest: int = peaks[max(species_counts)]
+    assert largest <= smallest * tolerance, f'Peak memory grew from {smallest} to {largest} bytes'
+    return peaks
+
+def check_concurrent_reads(reader_count: int = 4, species_count: int = 2000, writes: int = 3) -> dict[str, float]:
+    '''
+    Run `reader_count` threads through the reads that once created their tables (metadata,
+    cached subspecies and collection statistics), and through the whole Bird table, while one
+    writer applies `writes` taxonomy updates in turn. Each update renames every species and
+    drops a quarter of them, or puts them back, in one long transaction. Every read must see
+    Bird wholly before or wholly after an update, never empty or half replaced, and none may
+    wait an update out. Returns the slowest read and the shortest write in seconds, and the
+    number of reads; raises AssertionError on a read of neither state, or if that read took
+    half as long as that write.
+    >>> timings = check_concurrent_reads()
+    '''
+    from eBird_methods import EBirdWeb, EBirdBridge, UserLocalDBBridge, pinDatabaseFactory, database_pool, PinDatabaseInterface
+    from fake_ebird_server import EBirdFixtures
+
+    fixtures: EBirdFixtures = EBirdFixtures.synthetic(species_count, forms_per_species=0)
+    renamed: list[dict] = [{**species, 'comName': f'{species["comName"]} renamed'} 
+                           for species in fixtures.taxonomy[:species_count * 3 // 4]]
+    #(species, species renamed) in Bird before and after an update
+    states: set[tuple[int, int]] = {(len(fixtures.taxonomy), 0), (len(renamed), len(renamed))}
+    species_code: str = fixtures.taxonomy[0]['speciesCode']
+    read_seconds: list[float] = []
+    write_seconds: list[float] = []
+    failures: list[BaseException] = []
+    done = threading.Event()
+
+    def read() -> None:
+        ebird_bridge = EBirdBridge(web=EBirdWeb())
+        user_bridge = UserLocalDBBridge()
+        try:
+            while not done.is_set():
+                start: float = time.perf_counter()
+                ebird_bridge.LocalDBInterface.get_metadata('taxonomy_version')
+                ebird_bridge.retrieve_subspecies(species_code)
+                user_bridge.pin_counts('species')
+                names: list[str] = [bird['common_name'] for bird in user_bridge.LocalDBInterface.bird_table.query(columns=['common_name'])]
+                read_seconds.append(time.perf_counter() - start)
+                state: tuple[int, int] = (len(names), sum(name.endswith(' renamed') for name in names))
+                assert state in states, f'Read {state[0]} species, {state[1]} renamed, mid-update'
+                #Paced like a user's actions, rather than starving the writer of the GIL
+                time.sleep(0.01)
+        except BaseException as err:
+            failures.append(err)
+        finally:
+            ebird_bridge.close_connection()
+            user_bridge.close_connection()
+
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        os.chdir(scratch_directory)
+        try:
+            database: PinDatabaseInterface = pinDatabaseFactory()
+            database.initialise_database()
+            database.update_ebird_data(fixtures.taxonomy)
+            #Fetched just now, so retrieve_subspecies answers from the database without asking eBird
+            database.subspecies_fetch_table.replace_data([{'species': species_code, 'fetched_at': time.time()}])
+            readers: list[threading.Thread] = [threading.Thread(target=read) for _ in range(reader_count)]
+            for reader in readers:
+                reader.start()
+            try:
+                for write in range(writes):
+                    start: float = time.perf_counter()
+                    database.update_ebird_data(renamed if write % 2 == 0 else fixtures.taxonomy)
+                    write_seconds.append(time.perf_counter() - start)
+            finally:
+                done.set()
+                for reader in readers:
+                    reader.join()
+        finally:
+            #Let go of the scratch database before its directory is removed
+            database_pool.close()
+            os.chdir(working_directory)
+    if failures:
+        raise failures[0]
+    timings: dict[str, float] = {'slowest read seconds': max(read_seconds), 
+                                 'shortest write seconds': min(write_seconds), 
+                                 'reads': len(read_seconds)}
+    assert timings['slowest read seconds'] < timings['shortest write seconds'] / 2, f'A read waited on a write: {timings}'
+    return timings
+
+def check_shared_subspecies_lookups(lookup_count: int = 6, latency: float = 0.2) -> dict[str, int]:
+    '''
+    Look up one species' subspecies from `lookup_count` threads at once, against a
+    FakeEBirdServer slow enough that the lookups overlap. They should share one lookup, so
+    eBird is asked once and the subspecies are stored once. Returns the requests, stores and
+    subspecies each thread got; raises AssertionError if any is repeated or missing.
+    >>> check_shared_subspecies_lookups()
+    {'requests': 2, 'stores': 1, 'subspecies': 2}
+    '''
+    from eBird_methods import EBirdWeb, EBirdBridge, pinDatabaseFactory, database_pool, PinDatabaseInterface
+    from fake_ebird_server import EBirdFixtures, FakeEBirdServer
+
+    fixtures: EBirdFixtures = EBirdFixtures.synthetic(10)
+    species_code: str = fixtures.taxonomy[0]['speciesCode']
+    stores: list[str] = []
+    found: list[int] = []
+    failures: list[BaseException] = []
+    start = threading.Barrier(lookup_count)
+
+    class CountingBridge(EBirdBridge):
+        def _store_subspecies(self, species_code: str, subspecies: list) -> None:
+            stores.append(species_code)
+            super()._store_subspecies(species_code, subspecies)
+
+    def look_up(base_url: str) -> None:
+        bridge = CountingBridge(web=EBirdWeb(base_url=base_url))
+        try:
+            start.wait()
+            found.append(len(bridge.retrieve_subspecies(species_code) or []))
+        except BaseException as err:
+            failures.append(err)
+        finally:
+            bridge.close_connection()
+
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory, FakeEBirdServer(fixtures, latency=latency) as server:
+        os.chdir(scratch_directory)
+        try:
+            database: PinDatabaseInterface = pinDatabaseFactory()
+            database.initialise_database()
+            database.update_ebird_data(fixtures.taxonomy)
+            lookups: list[threading.Thread] = [threading.Thread(target=look_up, args=(server.base_url,)) for _ in range(lookup_count)]
+            for lookup in lookups:
+                lookup.start()
+            for lookup in lookups:
+                lookup.join()
+        finally:
+            database_pool.close()
+            os.chdir(working_directory)
+    if failures:
+        raise failures[0]
+    assert len(set(found)) == 1 and len(found) == lookup_count, f'Lookups found different subspecies: {found}'
+    #One request for the forms, one for their taxonomy
+    assert server.requests['total'] == 2, f'eBird asked {server.requests["total"]} times'
+    assert len(stores) == 1, f'Subspecies stored {len(stores)} times'
+    return {'requests': server.requests['total'], 'stores': len(stores), 'subspecies': found[0]}
+
+def check_taxonomy_responses_closed(species_count: int = 50, wait: float = 5) -> list[str]:
+    '''
+    Update the taxonomy from FakeEBirdServer over a single pooled connection, through a full
+    download, a 304 and a server error, and after each make another request. A taxonomy
+    response left open would keep the connection, so the next request would wait on the pool
+    forever. Returns each update's cache outcome; raises AssertionError if a request waits
+    longer than `wait` seconds.
+    >>> check_taxonomy_responses_closed()
+    ['miss', 'hit', 'miss']
+    '''
+    from eBird_methods import EBirdWeb, EBirdBridge, pinDatabaseFactory, database_pool, PinDatabaseInterface
+    from fake_ebird_server import EBirdFixtures, FakeEBirdServer
+
+    fixtures: EBirdFixtures = EBirdFixtures.synthetic(species_count, forms_per_species=0)
+    outcomes: list[str] = []
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory, FakeEBirdServer(fixtures) as server:
+        os.chdir(scratch_directory)
+        try:
+            database: PinDatabaseInterface = pinDatabaseFactory()
+            database.initialise_database()
+            database_pool.release(database)
+            bridge = EBirdBridge(web=EBirdWeb(max_connections=1, max_retries=0, base_url=server.base_url))
+            for version, error_rate in ((2024.0, 0), (2025.0, 0), (2026.0, 1)):
+                #A newer version each time, so every update asks for the taxonomy itself
+                fixtures.versions = [{'authorityVer': version, 'latest': True}]
+                server.error_rate = error_rate
+                #throw_connection_error prints the failed status
+                with contextlib.redirect_stdout(io.StringIO()):
+                    outcomes.append(bridge.update_database()['cache'])
+                server.error_rate = 0
+                versions: list = []
+                request = threading.Thread(target=lambda: versions.append(bridge.EBirdWeb.get_taxonomy_version()), daemon=True)
+                request.start()
+                request.join(wait)
+                assert versions == [version], f'Request after a {outcomes[-1]} update waited on the connection pool'
+            bridge.close_connection()
+        finally:
+            database_pool.close()
+            os.chdir(working_directory)
+    return outcomes
+
+def check_async_taxonomy(species_count: int = 200, wait: float = 5) -> dict[str, int]:
+    '''
+    Fetch the taxonomy from FakeEBirdServer through AsyncEBirdWeb over a single pooled
+    connection, then the subspecies of a few species over the same connection. The taxonomy
+    must come back parsed, with its response closed, or the subspecies lookups would wait on
+    the pool forever. Returns the taxa (species and forms) and subspecies lookups answered;
+    raises AssertionError if either is short or the event loop is still running after `wait`
+    seconds.
+    >>> check_async_taxonomy()
+    {'taxa': 400, 'subspecies lookups': 3}
+    '''
+    import asyncio
+    from eBird_methods import EBirdWeb, AsyncEBirdWeb
+    from fake_ebird_server import EBirdFixtures, FakeEBirdServer
+
+    fixtures: EBirdFixtures = EBirdFixtures.synthetic(species_count)
+    species_codes: list[str] = list(fixtures.forms)[:3]
+    results: list[tuple] = []
+
+    async def fetch(base_url: str) -> None:
+        async with AsyncEBirdWeb(max_concurrency=1, web=EBirdWeb(max_connections=1, base_url=base_url)) as web:
+            taxonomy: list[dict] | None = await web.get_data()
+            results.append((taxonomy, await web.gather_subspecies_data(species_codes)))
+
+    with FakeEBirdServer(fixtures) as server:
+        #On a thread of its own, so a lookup stuck on the pool fails the check rather than hanging it
+        loop = threading.Thread(target=lambda: asyncio.run(fetch(server.base_url)), daemon=True)
+        loop.start()
+        loop.join(wait)
+    assert results, f'Subspecies lookups still waiting on the connection pool after {wait} seconds'
+    taxonomy, subspecies = results[0]
+    assert isinstance(taxonomy, list) and len(taxonomy) == len(fixtures.taxonomy), f'Got {type(taxonomy).__name__} for the taxonomy'
+    answered: int = sum(forms is not None for forms in subspecies.values())
+    assert answered == len(species_codes), f'Only {answered} subspecies lookups answered'
+    return {'taxa': len(taxonomy), 'subspecies lookups': answered}
+
+def main(auto_test: bool = False):
+    if auto_test:
+        import doctest
+        doctest.testmod()
+        return None
+    import argparse
+    parser = argparse.ArgumentParser(description='Check the pin database against scratch copies.')
+    parser.add_argument('--search-speedup', action='store_true', help='time indexed species searches against a full scan')
+    parser.add_argument('--species', type=int, default=11000)
+    parser.add_argument('--threshold', type=int, default=80)
+    parser.add_argument('--memory-check', action='store_true', help='check taxonomy ingestion memory stays flat')
+    parser.add_argument('--concurrency-check', action='store_true', help='check reads see whole taxonomy updates and never wait on them')
+    parser.add_argument('--workers', type=int, default=4, help='reader threads for the concurrency check')
+    arguments = parser.parse_args()
+    if arguments.search_speedup:
+        for name, value in check_search_speedup(species_count=arguments.species, threshold=arguments.threshold).items():
+            print(f'{name}: {value}')
+        return None
+    if arguments.memory_check:
+        for species_count, peak in check_ingestion_memory().items():
+            print(f'{species_count} species: peak {peak / 1024:.0f} KiB')
+        return None
+    if arguments.concurrency_check:
+        for name, value in check_concurrent_reads(reader_count=arguments.workers).items():
+            print(f'{name}: {value}')
+        return None
+    main(auto_test=True)
+    return None
+
+if __name__ == '__main__':
+    logging.basicConfig(filename='database_checks.log', level=logging.INFO)
+    logger.info(f'{"begin log":{"-"}^40}')
+    try:
+        main()
+    except Exception as err:
+        logger.exception(f'Got exception on main handler: {err}')
+        raise
+    finally:
+        logger.info(f'{"end log":{"-"}^40}')
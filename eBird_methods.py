@@ -1,30 +1,120 @@
 #SQL modules
 import sqlite3 as sql
 import peewee as pw
+from playhouse.migrate import SqliteMigrator, migrate
 #API module
 import requests
-#Fuzzy searching
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+#Fuzzy searching and name normalisation
 from fuzzywuzzy import fuzz
+import re
+import unicodedata
 #Typing, decorators, logging
 from abc import ABC, abstractmethod
-from typing import Callable, TypeVar, TypeAlias, Generic, Optional, Sequence, Literal
+from typing import Callable, TypeVar, TypeAlias, TypedDict, Generic, Optional, Sequence, Literal, Iterable, Iterator, Any
 import logging
 #Timing functions
 import time
+#Transactions
+from contextlib import contextmanager
+#Background scheduling and concurrent requests
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+#Response caching and streaming
+import codecs
+import hashlib
+import itertools
+import json
+import os
+#In-process caching and ranking
+from collections import Counter, OrderedDict, deque
+from functools import cache
+import heapq
 #Note to self: download when not on train
 #from deprecated import deprecated
 
 from hidden_keys import API_Keys
 
 from pin_database_schema import DATABASE
-from pin_database_schema import Bird, BirdSubspecies, Supergroup, Subgroup, Source, Pin
-from pin_database_schema import Table, DataDict, PinDict, BirdDict, SourceDict, SubspeciesDict, SubgroupDict, SupergroupDict
+from pin_database_schema import Bird, BirdSubspecies, Supergroup, Subgroup, Source, Pin, Metadata, SubspeciesFetch, BirdBigram, BirdSearch, CollectionStatistic
+from pin_database_schema import BirdRecord, RecordType
+from pin_database_schema import Table, DataDict, PinDict, BirdDict, SourceDict, SubspeciesDict, SubgroupDict, SupergroupDict, MetadataDict, SubspeciesFetchDict, BigramDict, SpeciesSearchDict, CollectionStatisticDict
 
 #Type shorthands for type hinting
 Response = requests.models.Response
 ResponseJson = TypeVar('ResponseJson')
 ReturnType = TypeVar('ReturnType')
 DictWithScore: TypeAlias = tuple[DataDict,int]
+#'skipped' means the version check showed the local taxonomy is current, so nothing was downloaded
+CacheStatus: TypeAlias = Literal['hit', 'miss', 'skipped']
+SpeciesSearchEngine: TypeAlias = Literal['bigram', 'fts5']
+StorageProfileName: TypeAlias = Literal['interactive', 'durable']
+#A batch input name, its best matching birds, and their scores
+NameMatch: TypeAlias = tuple[str, list[BirdDict], list[int]]
+#Groups the pin collection is counted by in CollectionStatistic
+StatisticDimension: TypeAlias = Literal['species', 'source', 'subgroup', 'order', 'family']
+
+class TaxonomyChanges(TypedDict):
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+class UpdateReport(TypedDict):
+    cache: CacheStatus
+    updated: bool
+    taxonomy_version: Optional[float]
+    changes: Optional[TaxonomyChanges]
+
+class SpeciesCacheStats(TypedDict):
+    hits: int
+    misses: int
+    rebuilds: int
+    generation: int
+
+class PrefetchReport(TypedDict):
+    species_fetched: int
+    species_failed: int
+    species_skipped: int
+    subspecies_stored: int
+
+class FamilyCoverage(TypedDict):
+    family: str
+    #Species in the taxonomy, and how many of them have at least one pin
+    species: int
+    pinned_species: int
+
+class StorageProfile(TypedDict):
+    journal_mode: str
+    synchronous: str
+    #Negative sizes are in KiB
+    cache_size: int
+    mmap_size: int
+    temp_store: str
+
+CACHE_DIRECTORY: str = 'ebird_cache'
+#Point at a local stand-in (see fake_ebird_server.py) to run without a live key or connection
+EBIRD_API_URL: str = os.environ.get('EBIRD_API_URL', 'https://api.ebird.org/v2')
+#Seconds before locally stored subspecies are looked up again
+SUBSPECIES_MAX_AGE: float = 30 * 24 * 60 * 60
+#British spellings in common names, keyed to the American ones eBird also uses
+SPELLING_VARIANTS: dict[str, str] = {'grey': 'gray', 'greyish': 'grayish', 'colour': 'color', 'coloured': 'colored', 
+                                     'sulphur': 'sulfur', 'moustached': 'mustached', 'ochre': 'ocher', 'centre': 'center'}
+#'fts5' ranks species in SQLite across names, family and code; 'bigram' scores common names in Python
+SPECIES_SEARCH_ENGINE: SpeciesSearchEngine = 'bigram'
+#Hold the cached taxonomy as read-only BirdRecords, so species searches return those rather than BirdDicts
+SPECIES_CACHE_COMPACT: bool = False
+#SQLite settings per connection. All keep WAL, which other threads' readers rely on (and which
+#cannot be left while they are connected). 'interactive' keeps synchronous at normal: in WAL mode
+#that already skips the fsync per commit, while off could corrupt the whole file, pins included, on
+#an OS crash or power loss. Taxonomy updates use it too, as a larger cache and mmap made no
+#measurable difference to them. 'durable' syncs every commit, for pins entered by hand.
+STORAGE_PROFILES: dict[StorageProfileName, StorageProfile] = {
+    'interactive': {'journal_mode': 'wal', 'synchronous': 'normal', 'cache_size': -16384, 'mmap_size': 67108864, 'temp_store': 'memory'},
+    'durable': {'journal_mode': 'wal', 'synchronous': 'full', 'cache_size': -16384, 'mmap_size': 0, 'temp_store': 'default'}}
+STORAGE_PROFILE: StorageProfileName = 'interactive'
 
 
 logger = logging.getLogger('eBird_methods')
@@ -55,15 +145,233 @@ def logged(print_args: bool = True):
         return log_wrapper
     return logged_decorator
 
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[dict]:
+    '''
+    Incrementally parse a top-level JSON array from a stream of byte chunks, yielding one
+    element at a time, so only the current chunk and element are held in memory.
+    >>> list(iter_json_array([b'[{"a": 1},', b' {"b": [2, ', b'3]}]']))
+    [{'a': 1}, {'b': [2, 3]}]
+    '''
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer: str = ''
+    array_started: bool = False
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        position: int = 0
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','):
+                position += 1
+            if position >= len(buffer):
+                break
+            if not array_started:
+                if buffer[position] != '[':
+                    raise ValueError('Expected a JSON array')
+                array_started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return None
+            try:
+                element, element_end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                #The element continues in the next chunk
+                break
+            if element_end >= len(buffer):
+                #A trailing number could still be cut short, so wait for more input
+                break
+            yield element
+            position = element_end
+        buffer = buffer[position:]
+    raise ValueError('JSON array ended unexpectedly')
+
+def normalise_name(name: str) -> str:
+    '''
+    Search key for a bird name: lowercase, accents dropped, apostrophes removed, other
+    punctuation turned into spaces and British spellings given their American form.
+    >>> normalise_name('Grey-headed Bulbul'), normalise_name("Kittlitz's Murrelet"), normalise_name('Rüppell’s Vulture')
+    ('gray headed bulbul', 'kittlitzs murrelet', 'ruppells vulture')
+    '''
+    decomposed: str = unicodedata.normalize('NFKD', name.lower())
+    unaccented: str = ''.join(character for character in decomposed if not unicodedata.combining(character))
+    words: list[str] = re.sub(r"[^\w\s/]", ' ', re.sub(r"['’ʻ`]", '', unaccented)).split()
+    return ' '.join(SPELLING_VARIANTS.get(word, word) for word in words)
+
+SOUNDEX_CODES: dict[str, str] = {**dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'), 
+                                 'l': '4', **dict.fromkeys('mn', '5'), 'r': '6'}
+
+def _soundex(word: str) -> str:
+    digits: list[str] = []
+    previous: str = SOUNDEX_CODES.get(word[0], '')
+    for character in word[1:]:
+        code: str = SOUNDEX_CODES.get(character, '')
+        if code and code != previous:
+            digits.append(code)
+        #h and w do not separate letters with the same code
+        if character not in 'hw':
+            previous = code
+    return (word[0].upper() + ''.join(digits) + '000')[:4]
+
+def phonetic_key(name: str) -> str:
+    '''
+    Soundex code of each word of the normalised name, for names spelt the way they sound.
+    >>> phonetic_key('Grey Wagtail'), phonetic_key('Gray Wagtial')
+    ('G600 W234', 'G600 W234')
+    '''
+    return ' '.join(_soundex(word) for word in normalise_name(name).split() if word.isalpha())
+
+def search_keys(name: str) -> dict[str, str]:
+    return {'search_name': normalise_name(name), 'phonetic_key': phonetic_key(name)}
+
+def trigrams(text: str) -> set[str]:
+    '''
+    >>> sorted(trigrams('Rock Dove'))
+    [' do', 'ck ', 'dov', 'k d', 'ock', 'ove', 'roc']
+    '''
+    lowered: str = text.lower()
+    return {lowered[position:position+3] for position in range(len(lowered) - 2)}
+
+def bigram_counts(text: str) -> Counter:
+    '''
+    >>> bigram_counts('chachalaca')['ch']
+    2
+    '''
+    lowered: str = text.lower()
+    return Counter(lowered[position:position+2] for position in range(len(lowered) - 1))
+
+@cache
+def min_shared_bigrams(length: int, threshold: int) -> int:
+    '''
+    Fewest bigram positions of the shorter name, of `length` characters, that must hold a bigram
+    of the longer for partial_ratio to reach `threshold`. partial_ratio rounds 2M/(length + w),
+    M being the characters matched between the shorter name and a window of w <= length
+    characters of the longer. Those matches fall in blocks, and each block boundary needs one of
+    the length + w - 2M unmatched characters, so at least M - 1 - (length + w - 2M) bigrams
+    survive whole; the worst window length is taken. Trigrams would need 5M - 2(length + w) - 2,
+    which is never positive at the default threshold of 80.
+    >>> min_shared_bigrams(len('maroon pigeon'), 80), min_shared_bigrams(len('maroon pigeon'), 95)
+    (4, 10)
+    '''
+    shared: list[int] = []
+    for window in range(length + 1):
+        #Fewest matches for 100*2M/(length + window) to round to the threshold
+        matches: int = -(-(2 * threshold - 1) * (length + window) // 400)
+        if matches <= window:
+            shared.append(3 * matches - length - window - 1)
+    return min(shared, default=0)
+
+def longest_unprunable_length(max_length: int, threshold: int) -> int:
+    '''
+    Longest name, up to max_length, whose bigrams cannot rule it out, so it must always be scored.
+    >>> longest_unprunable_length(20, 80)
+    3
+    '''
+    return max((length for length in range(max_length + 1) if min_shared_bigrams(length, threshold) <= 0), default=0)
+
+def partial_ratio_upper_bound(first: str, second: str) -> int:
+    '''
+    Cheap ceiling on fuzz.partial_ratio of two lowercased strings. partial_ratio scores windows of
+    the longer string against the shorter, and SequenceMatcher cannot match more characters (M)
+    than a window has in common with the shorter string, so 2M/(n + w) for the best window of
+    w <= n characters, n being the shorter string's length, bounds it.
+    >>> partial_ratio_upper_bound('maroon pigeon', 'rameron pigeon'), fuzz.partial_ratio('maroon pigeon', 'rameron pigeon')
+    (92, 88)
+    >>> partial_ratio_upper_bound('robin', 'ruby crowned kinglet'), fuzz.partial_ratio('robin', 'ruby crowned kinglet')
+    (60, 60)
+    '''
+    return _partial_ratio_upper_bound(Counter(first), first, second)
+
+def _partial_ratio_upper_bound(first_counts: Counter, first: str, second: str) -> int:
+    shorter_counts: Counter = first_counts
+    shorter, longer = first, second
+    if len(second) < len(first):
+        shorter_counts, shorter, longer = Counter(second), second, first
+    length: int = len(shorter)
+    if length == 0:
+        return 0
+    #Characters of the shorter string the window has yet to supply, negative for ones it has spare
+    unmatched: dict[str, int] = dict(shorter_counts)
+    shared: int = 0
+    for added in longer[:length]:
+        count: int = unmatched.get(added, 0)
+        if count > 0:
+            shared += 1
+        unmatched[added] = count - 1
+    #SequenceMatcher may start a window anywhere, so slide one along the longer string
+    most_shared: int = shared
+    for dropped, added in zip(longer, longer[length:]):
+        unmatched[dropped] += 1
+        if unmatched[dropped] > 0:
+            shared -= 1
+        count = unmatched.get(added, 0)
+        if count > 0:
+            shared += 1
+        unmatched[added] = count - 1
+        if shared > most_shared:
+            most_shared = shared
+    best: float = most_shared / length
+    #Windows starting within the last `length` characters are cut short
+    for start in range(max(1, len(longer) - length + 1), len(longer)):
+        unmatched[longer[start - 1]] += 1
+        if unmatched[longer[start - 1]] > 0:
+            shared -= 1
+        best = max(best, 2 * shared / (length + len(longer) - start))
+    return int(round(100 * best))
+
+def fts_trigram_query(text: str) -> str:
+    '''
+    FTS5 query for rows containing any of text's trigrams; bm25 then favours rows sharing more of them.
+    >>> fts_trigram_query('Emu"s')
+    '"emu" OR "mu""" OR "u""s"'
+    '''
+    return ' OR '.join('"' + trigram.replace('"', '""') + '"' for trigram in sorted(trigrams(text)))
+
+def fts_any_phrase_query(column: str, phrases: Iterable[str]) -> str:
+    '''
+    FTS5 query for rows whose column holds any of phrases; with the trigram tokenizer each needs 3 or more characters.
+    >>> fts_any_phrase_query('eBird_code', ['rocpig', 'ro"pig'])
+    'eBird_code : ("rocpig" OR "ro""pig")'
+    '''
+    return f'{column} : (' + ' OR '.join('"' + phrase.replace('"', '""') + '"' for phrase in phrases) + ')'
+
+def chunked(iterable: Iterable[ReturnType], size: int) -> Iterator[list[ReturnType]]:
+    '''
+    >>> list(chunked(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    '''
+    iterator: Iterator[ReturnType] = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+def sqlite_variable_limit(connection: sql.Connection) -> int:
+    '''Most ? parameters one statement may hold, by default 32766 from SQLite 3.32 and 999 before.'''
+    if hasattr(connection, 'getlimit'):
+        return connection.getlimit(sql.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return 32766 if sql.sqlite_version_info >= (3, 32) else 999
+
+@cache
+def fts5_trigram_available() -> bool:
+    '''Whether this SQLite has FTS5 and its trigram tokenizer (3.34+), tried once on a scratch database.'''
+    connection: sql.Connection = sql.connect(':memory:')
+    try:
+        connection.execute("CREATE VIRTUAL TABLE probe USING fts5(text, tokenize='trigram')")
+        return True
+    except sql.OperationalError as err:
+        logger.warning(f'Species search table unavailable: {err}')
+        return False
+    finally:
+        connection.close()
+
 class APIClass:
     def status_test(self, response: Response | None, 
                         success_function: Callable[[ResponseJson],ReturnType], 
                         failure_function: Callable[[int],None], 
-                        *args) -> ReturnType | None:
+                        *args,
+                        parser: Optional[Callable[[Response],ResponseJson]] = None) -> ReturnType | None:
         if response is None:
             return None
         if response.status_code == 200:
-            data: ResponseJson = response.json()
+            data: ResponseJson = response.json() if parser is None else parser(response)
             return success_function(data, *args)
         if not response:
             failure_function(response.status_code, *args)
@@ -75,47 +383,332 @@ class APIClass:
         print(f'Response code: {status_code}')
         return None
 
-class EBirdWeb(APIClass):
+class ResponseCache:
+    '''
+    On-disk cache of API responses, keyed by URL and locale. Each entry keeps the
+    response body alongside its validators (ETag, Last-Modified and a SHA-256 of the body).
+    Bodies are streamed to a pending file first and only replace the cached entry on commit.
+    '''
+    CHUNK_SIZE: int = 64 * 1024
+
+    def __init__(self, directory: str = CACHE_DIRECTORY) -> None:
+        self.directory: str = directory
+
+    def __repr__(self):
+        return '(class) eBird response cache'
+
+    def _key(self, url: str, locale: str) -> str:
+        return hashlib.sha256(f'{locale}|{url}'.encode()).hexdigest()
+
+    def _body_path(self, url: str, locale: str) -> str:
+        return os.path.join(self.directory, f'{self._key(url, locale)}.json')
+
+    def _pending_path(self, url: str, locale: str) -> str:
+        return self._body_path(url, locale) + '.part'
+
+    def _meta_path(self, url: str, locale: str) -> str:
+        return os.path.join(self.directory, f'{self._key(url, locale)}.meta.json')
+
+    def _read_meta(self, url: str, locale: str) -> dict[str, str | None]:
+        try:
+            with open(self._meta_path(url, locale)) as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return {}
+
+    def conditional_headers(self, url: str, locale: str) -> dict[str, str]:
+        meta: dict[str, str | None] = self._read_meta(url, locale)
+        headers: dict[str, str] = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def download(self, url: str, locale: str, response: Response) -> str:
+        '''Stream the response body to the pending file, returning its SHA-256.'''
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with open(self._pending_path(url, locale), 'wb') as pending_file:
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                digest.update(chunk)
+                pending_file.write(chunk)
+        return digest.hexdigest()
+
+    def is_unchanged(self, url: str, locale: str, response: Response, digest: Optional[str] = None) -> bool:
+        meta: dict[str, str | None] = self._read_meta(url, locale)
+        if not meta:
+            return False
+        if response.status_code == 304:
+            return True
+        return digest is not None and digest == meta.get('sha256')
+
+    def commit(self, url: str, locale: str, response: Response, digest: str) -> None:
+        meta: dict[str, str | None] = {'url': url, 
+                                       'locale': locale, 
+                                       'etag': response.headers.get('ETag'), 
+                                       'last_modified': response.headers.get('Last-Modified'), 
+                                       'sha256': digest}
+        #Write to temporary files first so an interrupted write never leaves a torn entry
+        meta_path: str = self._meta_path(url, locale)
+        with open(meta_path + '.tmp', 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(self._pending_path(url, locale), self._body_path(url, locale))
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def discard(self, url: str, locale: str) -> None:
+        try:
+            os.remove(self._pending_path(url, locale))
+        except FileNotFoundError:
+            pass
+
+    def _iter_file(self, path: str) -> Iterator[dict]:
+        with open(path, 'rb') as body_file:
+            yield from iter_json_array(iter(lambda: body_file.read(self.CHUNK_SIZE), b''))
+
+    def iter_pending(self, url: str, locale: str) -> Iterator[dict]:
+        return self._iter_file(self._pending_path(url, locale))
+
+    def iter_cached(self, url: str, locale: str) -> Optional[Iterator[dict]]:
+        body_path: str = self._body_path(url, locale)
+        if not os.path.exists(body_path):
+            return None
+        return self._iter_file(body_path)
+
+class RateLimiter:
+    '''
+    Thread-safe token bucket allowing `rate` acquisitions per second, with bursts of up to `burst`.
+    '''
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate: float = rate
+        self.burst: int = burst
+        self._tokens: float = burst
+        self._last_refill: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'(class) Rate limiter, {self.rate} per second'
+
+    def _reserve(self) -> float:
+        '''Take a token, returning how long the caller must wait before using it.'''
+        with self._lock:
+            now: float = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        wait: float = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return None
+
+    async def acquire_async(self) -> None:
+        wait: float = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return None
+
+class SingleFlight:
+    '''
+    Collapses concurrent calls for the same key into one: the first caller runs the function,
+    and callers arriving while it runs wait for and share its result.
+    '''
     def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, tuple[threading.Event, list]] = {}
+
+    def __repr__(self):
+        return '(class) Single-flight request group'
+
+    def do(self, key: str, function: Callable[[], ReturnType]) -> ReturnType:
+        with self._lock:
+            in_flight: Optional[tuple[threading.Event, list]] = self._in_flight.get(key)
+            leader: bool = in_flight is None
+            if in_flight is None:
+                in_flight = (threading.Event(), [])
+                self._in_flight[key] = in_flight
+        done, outcome = in_flight
+        if not leader:
+            done.wait()
+            result, error = outcome
+            if error is not None:
+                raise error
+            return result
+        try:
+            result = function()
+            outcome.extend([result, None])
+            return result
+        except BaseException as err:
+            outcome.extend([None, err])
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            done.set()
+
+class EBirdWeb(APIClass):
+    #Statuses worth retrying: rate limiting and transient server errors
+    RETRY_STATUSES: tuple[int, ...] = (429, 500, 502, 503, 504)
+    #Longest URL sent when batching species codes into one taxonomy request
+    MAX_URL_LENGTH: int = 2048
+
+    def __init__(self,
+                 connect_timeout: float = 5,
+                 read_timeout: float = 30,
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 max_connections: int = 4,
+                 locale: str = 'en_UK',
+                 cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 base_url: str = EBIRD_API_URL) -> None:
         self.api_key: str | None = API_Keys.get('EBIRD_API_KEY')
+        self.base_url: str = base_url.rstrip('/')
+        self.locale: str = locale
+        self.rate_limiter: Optional[RateLimiter] = rate_limiter
+        self.cache: ResponseCache = cache if cache is not None else ResponseCache()
+        self.timeout: tuple[float, float] = (connect_timeout, read_timeout)
+        self.session: requests.Session = self._build_session(max_retries, backoff_factor, max_connections)
     
     def __repr__(self):
         return '(class) eBird API manager'
 
-    def get_data(self) -> Response:
-        url: str = 'https://api.ebird.org/v2/ref/taxonomy/ebird?fmt=json&locale=en_UK'
-        response: Response = requests.request("GET", url, headers={'X-eBirdApiToken': self.api_key}, data={})
-        return response
+    def _build_session(self, max_retries: int, backoff_factor: float, max_connections: int) -> requests.Session:
+        #Exhausted retries hand back the last response rather than raising,
+        #so status_test sees the final outcome
+        retry = Retry(total=max_retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=self.RETRY_STATUSES,
+                      allowed_methods=['GET'],
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, 
+                              max_retries=retry, pool_block=True)
+        session = requests.Session()
+        if self.api_key:
+            session.headers.update({'X-eBirdApiToken': self.api_key})
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _get(self, url: str, headers: Optional[dict[str, str]] = None, stream: bool = False) -> Optional[Response]:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            return self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+        except requests.exceptions.RequestException as err:
+            logger.warning(f'Request to {url} failed: {err}')
+            return None
+
+    @property
+    def taxonomy_url(self) -> str:
+        return f'{self.base_url}/ref/taxonomy/ebird?fmt=json&locale={self.locale}'
+
+    def get_data(self, conditional: bool = True) -> Optional[Response]:
+        '''The taxonomy response, streamed, so the caller must close it (or use it in a with block).'''
+        headers: dict[str, str] = {}
+        if conditional:
+            headers = self.cache.conditional_headers(self.taxonomy_url, self.locale)
+        #Streamed, so the body goes straight to the cache instead of into memory
+        return self._get(self.taxonomy_url, headers=headers, stream=True)
+
+    def get_taxonomy_versions(self) -> Optional[Response]:
+        url: str = f'{self.base_url}/ref/taxonomy/versions'
+        return self._get(url)
+
+    def _latest_taxonomy_version(self, versions: list[dict]) -> Optional[float]:
+        latest: list[float] = [version['authorityVer'] for version in versions if version.get('latest')]
+        if latest:
+            return float(latest[0])
+        if versions:
+            return float(max(version['authorityVer'] for version in versions))
+        return None
+
+    def get_taxonomy_version(self) -> Optional[float]:
+        return self.status_test(response=self.get_taxonomy_versions(),
+                                success_function=self._latest_taxonomy_version,
+                                failure_function=self.throw_connection_error)
+
+    def download_taxonomy(self, response: Response) -> str:
+        return self.cache.download(self.taxonomy_url, self.locale, response)
+
+    def taxonomy_unchanged(self, response: Response, digest: Optional[str] = None) -> bool:
+        return self.cache.is_unchanged(self.taxonomy_url, self.locale, response, digest)
+
+    def iter_downloaded_taxonomy(self) -> Iterator[dict]:
+        return self.cache.iter_pending(self.taxonomy_url, self.locale)
+
+    def commit_taxonomy(self, response: Response, digest: str) -> None:
+        self.cache.commit(self.taxonomy_url, self.locale, response, digest)
+
+    def discard_taxonomy(self) -> None:
+        self.cache.discard(self.taxonomy_url, self.locale)
+
+    def iter_cached_taxonomy(self) -> Optional[Iterator[dict]]:
+        return self.cache.iter_cached(self.taxonomy_url, self.locale)
     
-    def _get_subspecies_codes(self, species_code: str) -> Response:
-        url: str = f'https://api.ebird.org/v2/ref/taxon/forms/{species_code}'
-        response: Response = requests.request("GET", url, headers={'X-eBirdApiToken': self.api_key}, data={})
-        return response
+    def _get_subspecies_codes(self, species_code: str) -> Optional[Response]:
+        url: str = f'{self.base_url}/ref/taxon/forms/{species_code}'
+        return self._get(url)
 
-    def _get_unfiltered_subspecies_data(self, subspecies_codes: list[str]) -> Response:
+    def _subspecies_data_url(self, subspecies_codes: list[str]) -> str:
         codes_list: str = ','.join(subspecies_codes)
-        url: str = f'https://api.ebird.org/v2/ref/taxonomy/ebird?fmt=json&locale=en_UK&species={codes_list}'
-        response: Response = requests.request("GET", url, headers={'X-eBirdApiToken': self.api_key}, data={})
-        return response
+        return f'{self.base_url}/ref/taxonomy/ebird?fmt=json&locale={self.locale}&species={codes_list}'
+
+    def _get_unfiltered_subspecies_data(self, subspecies_codes: list[str]) -> Optional[Response]:
+        return self._get(self._subspecies_data_url(subspecies_codes))
+
+    def batch_species_codes(self, species_codes: Iterable[str]) -> Iterator[list[str]]:
+        '''Group codes into the fewest taxonomy requests that keep each URL under MAX_URL_LENGTH.'''
+        available_length: int = self.MAX_URL_LENGTH - len(self._subspecies_data_url([]))
+        batch: list[str] = []
+        batch_length: int = 0
+        for code in species_codes:
+            #Codes after the first also need a separating comma
+            code_length: int = len(code) + (1 if batch else 0)
+            if batch and batch_length + code_length > available_length:
+                yield batch
+                batch, batch_length, code_length = [], 0, len(code)
+            batch.append(code)
+            batch_length += code_length
+        if batch:
+            yield batch
+
+    def get_subspecies_codes(self, species_code: str) -> Optional[list[str]]:
+        return self.status_test(response=self._get_subspecies_codes(species_code),
+                                success_function=lambda codes: codes,
+                                failure_function=self.throw_connection_error)
+
+    def get_filtered_subspecies_data(self, subspecies_codes: list[str]) -> Optional[list[SubspeciesDict]]:
+        return self.status_test(response=self._get_unfiltered_subspecies_data(subspecies_codes),
+                                success_function=self._filter_subspecies_data,
+                                failure_function=self.throw_connection_error)
 
     def _filter_subspecies_data(self, subspecies_data: list[dict]) -> list[SubspeciesDict]:
         filtered_subspecies_data: list[SubspeciesDict] = []
         for subspecies in filter(lambda x : not '/' in x, subspecies_data):
             if subspecies['category'] == 'species':
+                #The nominate form is the species itself, so it points back at its own code
                 filtered_subspecies_data.append({'eBird_code': subspecies['speciesCode'], 
                                                  'common_name': subspecies['comName'], 
                                                  'subspecies': '(Nominate)',
-                                                 'species': subspecies['sciName'].split()[1]})
+                                                 'species': subspecies['speciesCode'],
+                                                 **search_keys(subspecies['comName'])})
             elif subspecies['category'] == 'issf':
                 filtered_subspecies_data.append({'eBird_code': subspecies['speciesCode'], 
                                                  'common_name': subspecies['comName'], 
                                                  'subspecies': subspecies['sciName'],
-                                                 'species': subspecies['reportAs']})
+                                                 'species': subspecies['reportAs'],
+                                                 **search_keys(subspecies['comName'])})
         return filtered_subspecies_data
 
 
     def get_subspecies_data(self, species_code: str) -> Optional[list[SubspeciesDict]]:
-        subspecies_codes: Response = self._get_subspecies_codes(species_code)
+        subspecies_codes: Optional[Response] = self._get_subspecies_codes(species_code)
         unfiltered_subspecies_data: Optional[Response] = self.status_test(response=subspecies_codes,
                                                                        success_function=self._get_unfiltered_subspecies_data,
                                                                        failure_function=self.throw_connection_error)
@@ -124,15 +717,101 @@ class EBirdWeb(APIClass):
                                                                                  failure_function=self.throw_connection_error)
         return filtered_subspecies_data
 
+    def close(self) -> None:
+        self.session.close()
+
+class AsyncEBirdWeb:
+    '''
+    Coroutine counterpart to EBirdWeb. Calls run on worker threads over one EBirdWeb's pooled
+    session, at most `max_concurrency` at a time and, if given, at most `requests_per_second`.
+    '''
+    def __init__(self, 
+                 max_concurrency: int = 8, 
+                 requests_per_second: Optional[float] = None, 
+                 web: Optional[EBirdWeb] = None) -> None:
+        self.web: EBirdWeb = web if web is not None else EBirdWeb(max_connections=max_concurrency)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter: Optional[RateLimiter] = None
+        if requests_per_second is not None:
+            self.rate_limiter = RateLimiter(requests_per_second, burst=max_concurrency)
+
+    def __repr__(self):
+        return '(class) Asynchronous eBird API manager'
+
+    async def __aenter__(self) -> 'AsyncEBirdWeb':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    async def _call(self, function: Callable[..., ReturnType], *args) -> ReturnType:
+        async with self.semaphore:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            return await asyncio.to_thread(function, *args)
+
+    def _read_taxonomy(self) -> Optional[list[dict]]:
+        #Unconditional, as a 304 would leave nothing to return
+        response: Optional[Response] = self.web.get_data(conditional=False)
+        if response is None:
+            return None
+        with response:
+            return self.web.status_test(response=response, 
+                                        success_function=lambda taxonomy: taxonomy, 
+                                        failure_function=self.web.throw_connection_error)
+
+    async def get_data(self) -> Optional[list[dict]]:
+        '''
+        The whole taxonomy, parsed. The body is read on the worker thread as well, so a slow
+        download never blocks the event loop. It is held in memory, unlike in
+        EBirdBridge.update_database, which streams it through the response cache.
+        '''
+        return await self._call(self._read_taxonomy)
+
+    async def get_subspecies_data(self, species_code: str) -> Optional[list[SubspeciesDict]]:
+        #Two calls, so each takes its own turn under the semaphore and rate limit
+        subspecies_codes: Optional[list[str]] = await self._call(self.web.get_subspecies_codes, species_code)
+        if subspecies_codes is None:
+            return None
+        return await self._call(self.web.get_filtered_subspecies_data, subspecies_codes)
+
+    async def gather_subspecies_data(self, species_codes: Iterable[str]) -> dict[str, Optional[list[SubspeciesDict]]]:
+        unique_codes: list[str] = list(dict.fromkeys(species_codes))
+        results: list[Optional[list[SubspeciesDict]]] = await asyncio.gather(*(self.get_subspecies_data(code) 
+                                                                               for code in unique_codes))
+        return dict(zip(unique_codes, results))
+
+    def close(self) -> None:
+        self.web.close()
+
 class PinDatabaseInterface(ABC):
+    #Rows compared against the existing table per lookup during a taxonomy update
+    DIFF_CHUNK_SIZE: int = 500
+    #bm25 column weights for BirdSearch: eBird code, common name, scientific name, family
+    SPECIES_SEARCH_WEIGHTS: tuple[float, ...] = (1.0, 4.0, 2.0, 1.0)
+    #Stored in Metadata; an index of another version is rebuilt by upgrade_schema
+    BIGRAM_INDEX_VERSION: str = '1'
+    #Bumped by every taxonomy update that changes Bird, so in-process caches know to rebuild
+    taxonomy_generation: int = 0
+    _generation_lock: threading.Lock = threading.Lock()
+
     def __init__(self) -> None:
         self._open_connection()
+        self.storage_profile: StorageProfileName = STORAGE_PROFILE
+        self.apply_storage_profile(STORAGE_PROFILE)
+        #So rows that INSERT OR REPLACE overwrites still run the statistics triggers' delete step
+        self._set_pragma('recursive_triggers', 'on')
         self.bird_table: Table[BirdDict]
         self.bird_subspecies_table: Table[SubspeciesDict]
         self.supergroup_table: Table[SupergroupDict]
         self.source_table: Table[SourceDict]
         self.subgroup_table: Table[SubgroupDict]
         self.pin_table: Table[PinDict]
+        self.metadata_table: Table[MetadataDict]
+        self.subspecies_fetch_table: Table[SubspeciesFetchDict]
+        self.bird_bigram_table: Table[BigramDict]
+        self.bird_search_table: Table[SpeciesSearchDict]
+        self.collection_statistic_table: Table[CollectionStatisticDict]
 
     def __repr__(self):
         return '(class) Local database manager'
@@ -141,129 +820,588 @@ class PinDatabaseInterface(ABC):
     def _open_connection(self) -> None:
         pass
 
-    def initialise_database(self) -> None:
+    @abstractmethod
+    def _set_pragma(self, name: str, value: str | int) -> None:
+        pass
+
+    @abstractmethod
+    def _execute_sql(self, statement: str, parameters: Sequence = ()) -> None:
+        pass
+
+    def apply_storage_profile(self, profile: StorageProfileName) -> None:
+        '''Switch this connection to one of STORAGE_PROFILES. Not allowed inside a transaction.'''
+        for name, value in STORAGE_PROFILES[profile].items():
+            self._set_pragma(name, value)
+        self.storage_profile = profile
+        return None
+
+    @abstractmethod
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        '''Group table writes into one transaction, committed on exit and rolled back on error.'''
+        pass
+
+    @abstractmethod
+    def in_transaction(self) -> bool:
+        pass
+
+    @abstractmethod
+    def _check_foreign_keys(self) -> None:
+        '''Raise IntegrityError if any row refers to a row that does not exist.'''
+        pass
+
+    @contextmanager
+    def bulk_write(self, check_foreign_keys: bool = False) -> Iterator[None]:
+        '''
+        One transaction for any number of writes to any tables, committed on exit and rolled back
+        on error. Neither backend turns on SQLite's foreign_keys pragma, so rows may arrive in any
+        order and nothing checks their references unless asked: with check_foreign_keys, a row
+        left referring to nothing rolls everything back with IntegrityError. Inside a transaction
+        it joins that one, checking on the way out, before the outer transaction commits.
+        '''
+        if self.in_transaction():
+            yield None
+            if check_foreign_keys:
+                self._check_foreign_keys()
+            return None
+        with self.transaction():
+            yield None
+            if check_foreign_keys:
+                self._check_foreign_keys()
+
+    def _create_tables(self) -> None:
+        #DDL takes the writer lock, so only initialise_database and upgrade_schema run it, never a read
         self.bird_table.create()
         self.bird_subspecies_table.create()
-        self.subgroup_table.create()
+        self.supergroup_table.create()
         self.source_table.create()
         self.subgroup_table.create()
         self.pin_table.create()
+        self.metadata_table.create()
+        self.subspecies_fetch_table.create()
+        self.bird_bigram_table.create()
+        if self.species_search_available():
+            self.bird_search_table.create()
+        self.collection_statistic_table.create()
+        return None
 
-    def _clear_ebird_table(self) -> None:
-        self.bird_table.drop()
-        self.bird_table.create()
+    def initialise_database(self) -> None:
+        '''Create every table, index and trigger. Other methods expect this, or upgrade_schema, to have run.'''
+        self._create_tables()
+        self.install_collection_statistics()
+
+    def upgrade_schema(self) -> None:
+        '''
+        Bring an older database up to date: add the missing columns and lookup indexes, fill in
+        the search keys, point pins stored by common name at their eBird codes, and rebuild the
+        search indexes that were made from unnormalised names.
+        '''
+        self._create_tables()
+        #Superseded by BirdBigram, as trigrams cannot rule any name out at the default threshold
+        self._execute_sql('DROP TABLE IF EXISTS BirdTrigram')
+        with self.transaction():
+            birds: list[BirdDict] = self.bird_table.get_data_by_keys([''], column='search_name')
+            self.bird_table.update_data({bird['eBird_code']: search_keys(bird['common_name']) for bird in birds})
+            subspecies: list[SubspeciesDict] = self.bird_subspecies_table.get_data_by_keys([''], column='search_name')
+            self.bird_subspecies_table.update_data({form['eBird_code']: search_keys(form['common_name']) for form in subspecies})
+            #Pins entered by hand once held common names, which nothing joins Bird or BirdSubspecies on
+            self._execute_sql('''UPDATE Pin SET species = (SELECT eBird_code FROM Bird WHERE Bird.common_name = Pin.species)
+                                 WHERE species NOT IN (SELECT eBird_code FROM Bird)
+                                 AND species IN (SELECT common_name FROM Bird)''')
+            self._execute_sql('''UPDATE Pin SET subspecies = (SELECT eBird_code FROM BirdSubspecies
+                                                              WHERE BirdSubspecies.common_name = Pin.subspecies)
+                                 WHERE subspecies NOT IN (SELECT eBird_code FROM BirdSubspecies)
+                                 AND subspecies IN (SELECT common_name FROM BirdSubspecies)''')
+        if birds or self.get_metadata('bigram_index_version') != self.BIGRAM_INDEX_VERSION:
+            self.rebuild_bigram_index()
+        if birds:
+            if self.species_search_available():
+                self.rebuild_species_search()
+            self.bump_taxonomy_generation()
+        self.install_collection_statistics()
+        return None
+
+    def get_metadata(self, key: str) -> Optional[str]:
+        for entry in self.metadata_table.query(where={'key': key}, columns=['value']):
+            return entry['value']
+        return None
 
-    def _process_ebird_data(self, api_data: list[dict]) -> list[BirdDict]:
-        processed_data: list[BirdDict] = []
+    def set_metadata(self, key: str, value: str) -> None:
+        self.metadata_table.replace_data([{'key': key, 'value': value}])
+
+    def _process_ebird_data(self, api_data: Iterable[dict]) -> Iterator[BirdDict]:
         for species_profile in filter(lambda w: w['category'] == 'species', api_data):
-            processed_data.append({'eBird_code': species_profile['speciesCode'], 
-                                    'common_name': species_profile['comName'], 
-                                    'family_common_name': species_profile['familyComName'], 
-                                    'bird_order': species_profile['order'], 
-                                    'family': species_profile['familySciName'], 
-                                    'genus': species_profile['sciName'].split()[0], 
-                                    'species': species_profile['sciName'].split()[1]})
-        return processed_data
-
-    def update_ebird_data(self, api_data: list[dict]) -> None:
-        self._clear_ebird_table()
-        processed_data: list[BirdDict] = self._process_ebird_data(api_data)
-        self.bird_table.add_data(processed_data)
+            yield {'eBird_code': species_profile['speciesCode'], 
+                   'common_name': species_profile['comName'], 
+                   'family_common_name': species_profile['familyComName'], 
+                   'bird_order': species_profile['order'], 
+                   'family': species_profile['familySciName'], 
+                   'genus': species_profile['sciName'].split()[0], 
+                   'species': species_profile['sciName'].split()[1],
+                   **search_keys(species_profile['comName'])}
+
+    @abstractmethod
+    def find_bigram_matches(self, test_name: str, threshold: int) -> list[str]:
+        '''
+        eBird codes of birds whose search name could reach `threshold` against test_name, itself
+        a normalised name: enough bigram positions of the shorter of the two hold a bigram of
+        the longer (min_shared_bigrams). Names too short to rule out are always included.
+        '''
+        pass
+
+    def _required_bigram_positions(self, test_name: str, threshold: int) -> dict[int, int]:
+        '''min_shared_bigrams for each shorter-name length bigrams can rule out, up to test_name's.'''
+        short_length: int = longest_unprunable_length(len(test_name), threshold)
+        return {length: min_shared_bigrams(length, threshold) for length in range(short_length + 1, len(test_name) + 1)}
+
+    def _bigram_rows(self, birds: Iterable[BirdDict]) -> Iterator[BigramDict]:
+        for bird in birds:
+            for bigram, occurrences in bigram_counts(bird['search_name']).items():
+                yield {'bigram': bigram, 'eBird_code': bird['eBird_code'], 'occurrences': occurrences}
+
+    def rebuild_bigram_index(self) -> None:
+        with self.transaction():
+            #DELETE rather than DROP, as sqlite3 runs DDL outside the transaction, leaving the table empty to readers
+            self.bird_bigram_table.clear()
+            self.bird_bigram_table.add_data(self._bigram_rows(self.bird_table.iter_data()))
+            self.set_metadata('bigram_index_version', self.BIGRAM_INDEX_VERSION)
+
+    @classmethod
+    def bump_taxonomy_generation(cls) -> None:
+        with cls._generation_lock:
+            PinDatabaseInterface.taxonomy_generation += 1
+        return None
+
+    def species_search_available(self) -> bool:
+        '''False where SQLite lacks FTS5 or its trigram tokenizer, in which case there is no BirdSearch table.'''
+        return fts5_trigram_available()
+
+    @abstractmethod
+    def search_species(self, query: str, limit: int) -> list[BirdDict]:
+        '''Birds sharing any trigram with query in BirdSearch, best bm25 rank first.'''
+        pass
+
+    def _search_rows(self, birds: Iterable[BirdDict]) -> Iterator[SpeciesSearchDict]:
+        for bird in birds:
+            yield {'eBird_code': bird['eBird_code'], 
+                   'common_name': bird['search_name'], 
+                   'scientific_name': f"{bird['genus']} {bird['species']}", 
+                   'family': f"{bird['family_common_name']} {bird['family']}"}
+
+    def delete_species_search(self, codes: Iterable[str]) -> None:
+        '''Remove these birds from BirdSearch, found through the full-text index rather than a scan of the table.'''
+        short_codes: list[str] = []
+        for chunk in chunked(codes, self.DIFF_CHUNK_SIZE):
+            short_codes += [code for code in chunk if len(code) < 3]
+            chunk = [code for code in chunk if len(code) >= 3]
+            if not chunk:
+                continue
+            #The MATCH narrows to rows holding each code's trigrams; the IN drops codes that merely contain one
+            self._execute_sql(f'''DELETE FROM BirdSearch WHERE rowid IN 
+                                  (SELECT rowid FROM BirdSearch WHERE BirdSearch MATCH ?) 
+                                  AND eBird_code IN ({','.join('?' * len(chunk))})''',
+                              (fts_any_phrase_query('eBird_code', chunk), *chunk))
+        self.bird_search_table.delete_data(short_codes, column='eBird_code')
+        return None
+
+    def rebuild_species_search(self) -> None:
+        with self.transaction():
+            self.bird_search_table.clear()
+            self.bird_search_table.add_data(self._search_rows(self.bird_table.iter_data()))
+
+    #Pin's foreign key columns, as this backend names them
+    STATISTICS_PIN_COLUMNS: dict[str, str] = {'species': 'species', 'source': 'source', 'subgroup': 'subgroup'}
+    #Metadata key set, inside a transaction only, while the statistics triggers stand aside
+    STATISTICS_PAUSED_KEY: str = 'collection_statistics_paused'
+
+    def _statistic_upsert(self, dimension: str, name: str, step: str, selection: str) -> str:
+        #selection always ends in a WHERE, which SQLite needs to tell the upsert's ON CONFLICT from a join's ON
+        return (f"INSERT INTO CollectionStatistic(dimension, name, count) SELECT '{dimension}', {name}, {step} {selection} "
+                f"ON CONFLICT(dimension, name) DO UPDATE SET count = count + excluded.count;")
+
+    def _pin_statistic_steps(self, row: Literal['NEW', 'OLD'], step: int) -> list[str]:
+        '''Statements counting a pin (step 1) or no longer counting it (step -1).'''
+        species, source, subgroup = (f'{row}.{column}' for column in self.STATISTICS_PIN_COLUMNS.values())
+        bird: str = f'FROM Bird WHERE eBird_code = {species}'
+        #The species' first pin going in, or its last one going out, after its own count has moved
+        species_pins: str = f"(SELECT count FROM CollectionStatistic WHERE dimension = 'species' AND name = {species})"
+        return [self._statistic_upsert('species', species, str(step), 'WHERE true'),
+                self._statistic_upsert('source', source, str(step), 'WHERE true'),
+                self._statistic_upsert('subgroup', subgroup, str(step), f'WHERE {subgroup} IS NOT NULL'),
+                self._statistic_upsert('order', 'bird_order', str(step), bird),
+                self._statistic_upsert('family', 'family', str(step), bird),
+                self._statistic_upsert('family_pinned_species', 'family', str(step), 
+                                       f'{bird} AND {species_pins} = {1 if step > 0 else 0}')]
+
+    def _bird_statistic_steps(self, row: Literal['NEW', 'OLD'], step: int) -> list[str]:
+        '''Statements adding a bird, and any pins it already has, to its family and order, or taking them away.'''
+        species_pins: str = f"FROM CollectionStatistic WHERE dimension = 'species' AND name = {row}.eBird_code AND count > 0"
+        pins: str = 'count' if step > 0 else '-count'
+        return [self._statistic_upsert('family_species', f'{row}.family', str(step), 'WHERE true'),
+                self._statistic_upsert('order', f'{row}.bird_order', pins, species_pins),
+                self._statistic_upsert('family', f'{row}.family', pins, species_pins),
+                self._statistic_upsert('family_pinned_species', f'{row}.family', str(step), species_pins)]
+
+    def _statistics_triggers(self) -> dict[str, str]:
+        pin_columns: str = ', '.join(self.STATISTICS_PIN_COLUMNS.values())
+        triggers: dict[str, tuple[str, list[str]]] = {
+            'Pin_statistics_insert': ('AFTER INSERT ON Pin', self._pin_statistic_steps('NEW', 1)),
+            'Pin_statistics_delete': ('AFTER DELETE ON Pin', self._pin_statistic_steps('OLD', -1)),
+            'Pin_statistics_update': (f'AFTER UPDATE OF {pin_columns} ON Pin', 
+                                      self._pin_statistic_steps('OLD', -1) + self._pin_statistic_steps('NEW', 1)),
+            'Bird_statistics_insert': ('AFTER INSERT ON Bird', self._bird_statistic_steps('NEW', 1)),
+            'Bird_statistics_delete': ('AFTER DELETE ON Bird', self._bird_statistic_steps('OLD', -1)),
+            'Bird_statistics_update': ('AFTER UPDATE OF eBird_code, family, bird_order ON Bird', 
+                                       self._bird_statistic_steps('OLD', -1) + self._bird_statistic_steps('NEW', 1))}
+        unpaused: str = f"WHEN NOT EXISTS (SELECT 1 FROM Metadata WHERE key = '{self.STATISTICS_PAUSED_KEY}')"
+        return {name: f'CREATE TRIGGER IF NOT EXISTS {name} {event} {unpaused} BEGIN {" ".join(steps)} END' 
+                for name, (event, steps) in triggers.items()}
+
+    def rebuild_collection_statistics(self) -> None:
+        '''Count the whole collection again from Pin and Bird.'''
+        species, source, subgroup = self.STATISTICS_PIN_COLUMNS.values()
+        #Orders and families are summed from the species counts, so Pin is only read three times
+        pinned_birds: str = ("FROM CollectionStatistic JOIN Bird ON Bird.eBird_code = CollectionStatistic.name "
+                             "WHERE CollectionStatistic.dimension = 'species'")
+        with self.transaction():
+            self._execute_sql('DELETE FROM CollectionStatistic')
+            for dimension, name, count, selection in (('species', species, 'COUNT(*)', 'FROM Pin'),
+                                                       ('source', source, 'COUNT(*)', 'FROM Pin'),
+                                                       ('subgroup', subgroup, 'COUNT(*)', f'FROM Pin WHERE {subgroup} IS NOT NULL'),
+                                                       ('order', 'Bird.bird_order', 'SUM(count)', pinned_birds),
+                                                       ('family', 'Bird.family', 'SUM(count)', pinned_birds),
+                                                       ('family_pinned_species', 'Bird.family', 'COUNT(*)', pinned_birds),
+                                                       ('family_species', 'family', 'COUNT(*)', 'FROM Bird')):
+                self._execute_sql(f"INSERT INTO CollectionStatistic(dimension, name, count) "
+                                  f"SELECT '{dimension}', {name}, {count} {selection} GROUP BY {name}")
+        return None
+
+    def install_collection_statistics(self) -> None:
+        '''
+        Keep CollectionStatistic up to date with triggers on Pin and Bird, counting what is already
+        there first when the table is new.
+        '''
+        with self.transaction():
+            for trigger in self._statistics_triggers().values():
+                self._execute_sql(trigger)
+            if self.collection_statistic_table.is_empty() and not (self.pin_table.is_empty() and self.bird_table.is_empty()):
+                self.rebuild_collection_statistics()
+        return None
+
+    @contextmanager
+    def collection_statistics_paused(self) -> Iterator[None]:
+        '''
+        Write to Pin and Bird without the statistics triggers, counting everything again at the end
+        instead, which is cheaper once the writes run to thousands of rows. Holds a transaction, so
+        other connections never see the triggers paused.
+        '''
+        with self.transaction():
+            self.metadata_table.replace_data([{'key': self.STATISTICS_PAUSED_KEY, 'value': 'true'}])
+            yield None
+            self.metadata_table.delete_data([self.STATISTICS_PAUSED_KEY])
+            self.rebuild_collection_statistics()
+
+    def _diff_ebird_chunk(self, chunk: list[BirdDict], changes: TaxonomyChanges) -> None:
+        #Looked up per chunk rather than checked against a set of every code, so a first load holds no per-bird state
+        existing_rows: dict[str, BirdDict] = {row['eBird_code']: row for row in 
+                                              self.bird_table.get_data_by_keys([row['eBird_code'] for row in chunk])}
+        new_rows: list[BirdDict] = []
+        updated_rows: dict[str, dict[str, Any]] = {}
+        for row in chunk:
+            existing_row: Optional[BirdDict] = existing_rows.get(row['eBird_code'])
+            if existing_row is None:
+                new_rows.append(row)
+                continue
+            changed_columns: dict[str, Any] = {column: value for column, value in row.items() if existing_row[column] != value}
+            if changed_columns:
+                updated_rows[row['eBird_code']] = changed_columns
+            else:
+                changes['unchanged'] += 1
+        self.bird_table.add_data(new_rows)
+        self.bird_table.update_data(updated_rows)
+        #Keep the bigram index in step with any new or renamed birds
+        renamed_rows: list[BirdDict] = [row for row in chunk if 'search_name' in updated_rows.get(row['eBird_code'], {})]
+        self.bird_bigram_table.delete_data([row['eBird_code'] for row in renamed_rows], column='eBird_code')
+        self.bird_bigram_table.add_data(self._bigram_rows(new_rows + renamed_rows))
+        if self.species_search_available():
+            changed_rows: list[BirdDict] = [row for row in chunk if row['eBird_code'] in updated_rows]
+            self.delete_species_search(row['eBird_code'] for row in changed_rows)
+            self.bird_search_table.add_data(self._search_rows(new_rows + changed_rows))
+        changes['inserted'] += len(new_rows)
+        changes['updated'] += len(updated_rows)
+
+    def update_ebird_data(self, api_data: Iterable[dict]) -> TaxonomyChanges:
+        '''
+        Apply the taxonomy as a diff against the Bird table, keyed by eBird code, in one
+        transaction, so readers never see a partly loaded table. api_data may be a stream, and
+        beyond one chunk only the codes of birds already stored and not yet seen are held in
+        memory, which is nothing on a first load (see database_checks.check_ingestion_memory).
+        The collection statistics are counted again at the end rather than row by row.
+        '''
+        changes: TaxonomyChanges = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        self.upgrade_schema()
+        if self.bird_bigram_table.is_empty() and not self.bird_table.is_empty():
+            #Databases from before the index existed need it built once from the current rows
+            self.rebuild_bigram_index()
+        if self.species_search_available() and self.bird_search_table.is_empty() and not self.bird_table.is_empty():
+            self.rebuild_species_search()
+        with self.bulk_write(), self.collection_statistics_paused():
+            #Whatever is left once the whole taxonomy has gone past is no longer in it
+            removed_codes: set[str] = set(self.bird_table.get_keys())
+            for chunk in chunked(self._process_ebird_data(api_data), self.DIFF_CHUNK_SIZE):
+                self._diff_ebird_chunk(chunk, changes)
+                removed_codes.difference_update(row['eBird_code'] for row in chunk)
+            self.bird_table.delete_data(removed_codes)
+            self.bird_bigram_table.delete_data(removed_codes, column='eBird_code')
+            if self.species_search_available():
+                self.delete_species_search(removed_codes)
+            changes['deleted'] = len(removed_codes)
+        if changes['inserted'] or changes['updated'] or changes['deleted']:
+            self.bump_taxonomy_generation()
+        return changes
 
     @abstractmethod
     def close_connection(self) -> None:
         pass
 
 class PinDatabaseSQLite3(PinDatabaseInterface):
+    class DictRowFactory:
+        '''Row factory giving dicts, reading the column names once per statement rather than per row.'''
+        def __init__(self) -> None:
+            self._description: Optional[tuple] = None
+            self._fields: tuple[str, ...] = ()
+
+        def __repr__(self):
+            return '(class) Dict row factory'
+
+        def __call__(self, cursor: sql.Cursor, row: tuple) -> dict[str, Any]:
+            #sqlite3 keeps one description per executed statement, so a new one means new columns
+            description: tuple = cursor.description
+            if description is not self._description:
+                self._description = description
+                self._fields = tuple(column[0] for column in description)
+            return dict(zip(self._fields, row))
+
     class SqlTable(Table, Generic[DataDict]):
+        #Rows per executemany call when writing from a stream
+        CHUNK_SIZE: int = 1000
+        #Rows per fetchmany call when reading as a stream
+        FETCH_SIZE: int = 1000
+        #Writers across every thread's connection take turns, so none waits out SQLite's busy timeout
+        writer_lock: threading.RLock = threading.RLock()
+
         def __init__(self, 
-                     connection: sql.Connection, cursor: sql.Cursor, 
+                     connection: sql.Connection, 
                      name: str, 
-                     table_fields: list[tuple[str,str]], table_constraints: list[str]) -> None:
+                     table_fields: list[tuple[str,str]], table_constraints: list[str],
+                     table_indexes: Optional[list[str]] = None,
+                     module: Optional[str] = None) -> None:
             self.name: str = name
+            self.module: Optional[str] = module
             self.connection = connection
-            self.cursor = cursor
-            self.cursor.row_factory = self.dict_factory
+            #A cursor of its own, so reading one table while another is written leaves both results intact
+            self.cursor = connection.cursor()
             self.table_fields: list[tuple[str,str]] = table_fields
             self.table_constraints: list[str] | None = table_constraints
-            fields_and_constraints_list: list[str] = [' '.join(field_tuple) for field_tuple in table_fields] + table_constraints
+            #Virtual table columns (module is e.g. 'fts5') have no type, and options go with the constraints
+            fields_and_constraints_list: list[str] = [' '.join(field_tuple).strip() for field_tuple in table_fields] + table_constraints
             self.description: str =  f'{self.name}({", ".join(fields_and_constraints_list)})'
             self.no_of_cols: int = len(self.table_fields)
-            self.sql_create: str = f'CREATE TABLE IF NOT EXISTS {self.description}'
+            self.column_names: list[str] = [field for field, field_type in table_fields]
+            self.sql_create: str = (f'CREATE TABLE IF NOT EXISTS {self.description}' if module is None else 
+                                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} USING {module}({", ".join(fields_and_constraints_list)})')
+            self.sql_create_indexes: list[str] = [f'CREATE INDEX IF NOT EXISTS {self.name}_{column} ON {self.name}({column})' 
+                                                  for column in table_indexes or []]
             self.sql_drop: str = f'DROP TABLE IF EXISTS {self.name}'
             self.sql_insert: str = f'INSERT OR IGNORE INTO {self.name} VALUES({"?,"*(self.no_of_cols-1)}?)'
+            self.sql_replace: str = f'INSERT OR REPLACE INTO {self.name} VALUES({"?,"*(self.no_of_cols-1)}?)'
             self.sql_select: str = f'SELECT * FROM {self.name}'
+            self.sql_select_one: str = f'SELECT * FROM {self.name} LIMIT 1'
+            #Tables with a composite key are keyed by its first column
+            self.primary_key: str = next((field for field, field_type in table_fields if 'PRIMARY KEY' in field_type), 
+                                         table_fields[0][0])
+            self.sql_select_keys: str = f'SELECT {self.primary_key} FROM {self.name}'
+            #Cleared while a database-wide transaction is open, so writes join it instead of committing
+            self.autocommit: bool = True
 
-        def dict_factory(self, cursor, row):
-            fields = [column[0] for column in cursor.description]
-            return {key: value for key, value in zip(fields, row)}
+        @contextmanager
+        def _writing(self) -> Iterator[None]:
+            '''Hold the writer lock for a write, committing it unless a transaction() is open.'''
+            with self.writer_lock:
+                try:
+                    yield None
+                except BaseException:
+                    #Do not leave SQLite's write lock behind for the next writer
+                    if self.autocommit:
+                        self.connection.rollback()
+                    raise
+                if self.autocommit:
+                    self.connection.commit()
 
         def create(self) -> None:
-            self.cursor.execute(self.sql_create)
-            self.connection.commit()
+            with self._writing():
+                self.cursor.execute(self.sql_create)
+                if self.module is None:
+                    existing_columns: set[str] = {column['name'] for column in self.cursor.execute(f'PRAGMA table_info({self.name})')}
+                    for field, field_type in self.table_fields:
+                        if field not in existing_columns:
+                            #Added after the table was first made, so it needs a default
+                            self.cursor.execute(f'ALTER TABLE {self.name} ADD COLUMN {field} {field_type}')
+                for sql_create_index in self.sql_create_indexes:
+                    self.cursor.execute(sql_create_index)
 
         def drop(self) -> None:
-            self.cursor.execute(self.sql_drop)
-            self.connection.commit()
+            with self._writing():
+                self.cursor.execute(self.sql_drop)
+
+        def clear(self) -> None:
+            with self._writing():
+                self.cursor.execute(f'DELETE FROM {self.name}')
+
+        def _execute_chunked(self, statement: str, data: Iterable[DataDict]) -> None:
+            with self._writing():
+                for chunk in chunked(data, self.CHUNK_SIZE):
+                    self.cursor.executemany(statement, [tuple(row.values()) for row in chunk])
+
+        def add_data(self, data: Iterable[DataDict]) -> None:
+            self._execute_chunked(self.sql_insert, data)
+
+        def replace_data(self, data: Iterable[DataDict]) -> None:
+            self._execute_chunked(self.sql_replace, data)
 
-        def add_data(self, data: list[DataDict]) -> None:
-            data_as_tuples: list[tuple] = []
-            for row in data:
-                data_as_tuples.append(tuple([value for value in row.values()]))
-            self.cursor.executemany(self.sql_insert, data_as_tuples)
-            self.connection.commit()
+        def update_data(self, changes: dict[Any, dict[str, Any]]) -> None:
+            with self._writing():
+                for key, columns in changes.items():
+                    assignments: str = ', '.join(f'{column} = ?' for column in columns)
+                    self.cursor.execute(f'UPDATE {self.name} SET {assignments} WHERE {self.primary_key} = ?', 
+                                        (*columns.values(), key))
+
+        def delete_data(self, keys: Iterable[Any], column: Optional[str] = None) -> None:
+            with self._writing():
+                self.cursor.executemany(f'DELETE FROM {self.name} WHERE {column or self.primary_key} = ?', [(key,) for key in keys])
 
         def get_data(self) -> list[DataDict]:
             return self.cursor.execute(self.sql_select).fetchall()
 
+        def iter_data(self) -> Iterator[DataDict]:
+            #A cursor of its own, so the table can be written to, or read again, part way through
+            cursor: sql.Cursor = self.connection.cursor()
+            try:
+                cursor.execute(self.sql_select)
+                while rows := cursor.fetchmany(self.FETCH_SIZE):
+                    yield from rows
+            finally:
+                cursor.close()
+
+        def get_records(self, record_type: type[RecordType]) -> list[RecordType]:
+            cursor: sql.Cursor = self.connection.cursor()
+            #Plain tuples, so no dict is made for any row
+            cursor.row_factory = None
+            try:
+                cursor.execute(f'SELECT {", ".join(map(self._column, record_type.__slots__))} FROM {self.name}')
+                return [record_type.from_values(row) for row in cursor]
+            finally:
+                cursor.close()
+
+        def get_keys(self) -> list[Any]:
+            return [row[self.primary_key] for row in self.cursor.execute(self.sql_select_keys)]
+
+        def get_data_by_keys(self, keys: Sequence[Any], column: Optional[str] = None) -> list[DataDict]:
+            rows: list[DataDict] = []
+            for chunk in chunked(keys, sqlite_variable_limit(self.connection)):
+                placeholders: str = ','.join('?' * len(chunk))
+                rows.extend(self.cursor.execute(f'{self.sql_select} WHERE {column or self.primary_key} IN ({placeholders})', chunk))
+            return rows
+
+        def _column(self, column: str) -> str:
+            #Column names go into the SQL itself, so only ever this table's own
+            if column not in self.column_names:
+                raise ValueError(f'{self.name} has no column {column!r}')
+            return column
+
+        def query(self, 
+                  where: Optional[dict[str, Any]] = None, 
+                  columns: Optional[Sequence[str]] = None, 
+                  order_by: Optional[Sequence[str]] = None, 
+                  limit: Optional[int] = None) -> list[DataDict]:
+            conditions: list[str] = []
+            parameters: list[Any] = []
+            for column, value in (where or {}).items():
+                if value is None:
+                    conditions.append(f'{self._column(column)} IS NULL')
+                elif isinstance(value, (list, tuple, set, frozenset)):
+                    conditions.append(f'{self._column(column)} IN ({",".join("?" * len(value))})')
+                    parameters.extend(value)
+                else:
+                    conditions.append(f'{self._column(column)} = ?')
+                    parameters.append(value)
+            statement: str = f'SELECT {", ".join(map(self._column, columns)) if columns else "*"} FROM {self.name}'
+            if conditions:
+                statement += f' WHERE {" AND ".join(conditions)}'
+            if order_by:
+                statement += ' ORDER BY ' + ', '.join(f'{self._column(column[1:])} DESC' if column.startswith('-') 
+                                                      else f'{self._column(column)} ASC' for column in order_by)
+            if limit is not None:
+                statement += ' LIMIT ?'
+                parameters.append(limit)
+            return self.cursor.execute(statement, parameters).fetchall()
+
+        def is_empty(self) -> bool:
+            return self.cursor.execute(self.sql_select_one).fetchone() is None
+
     def __init__(self) -> None:
         super().__init__()
         self.bird_table = self.SqlTable[BirdDict](name = 'Bird', 
                                                   connection=self.connection, 
-                                                  cursor=self.cursor, 
                                                   table_fields= [('eBird_code', 'TEXT NOT NULL PRIMARY KEY'),
                                                                  ('common_name', 'TEXT NOT NULL'), 
                                                                  ('family_common_name', 'TEXT NOT NULL'), 
                                                                  ('bird_order', 'TEXT NOT NULL'), 
                                                                  ('family', 'TEXT NOT NULL'), 
                                                                  ('genus', 'TEXT NOT NULL'), 
-                                                                 ('species', 'TEXT NOT NULL')], 
-                                                  table_constraints = [])
+                                                                 ('species', 'TEXT NOT NULL'),
+                                                                 ('search_name', "TEXT NOT NULL DEFAULT ''"),
+                                                                 ('phonetic_key', "TEXT NOT NULL DEFAULT ''")], 
+                                                  table_constraints = [],
+                                                  table_indexes=['search_name', 'phonetic_key'])
         self.bird_subspecies_table = self.SqlTable[SubspeciesDict](name = 'BirdSubspecies', 
                                                                    connection=self.connection, 
-                                                                   cursor=self.cursor,table_fields=[('eBird_code', 'TEXT NOT NULL PRIMARY KEY'), 
-                                                                                                    ('common_name', 'TEXT NOT NULL'),
-                                                                                                    ('subspecies', 'TEXT NOT NULL'),
-                                                                                                    ('species', 'TEXT NOT NULL')],
-                                                                   table_constraints=['FOREIGN KEY(species) REFERENCES bird(eBird_code)'])
+                                                                   table_fields=[('eBird_code', 'TEXT NOT NULL PRIMARY KEY'), 
+                                                                                 ('common_name', 'TEXT NOT NULL'),
+                                                                                 ('subspecies', 'TEXT NOT NULL'),
+                                                                                 ('species', 'TEXT NOT NULL'),
+                                                                                 ('search_name', "TEXT NOT NULL DEFAULT ''"),
+                                                                                 ('phonetic_key', "TEXT NOT NULL DEFAULT ''")],
+                                                                   table_constraints=['FOREIGN KEY(species) REFERENCES bird(eBird_code)'],
+                                                                   table_indexes=['species', 'search_name', 'phonetic_key'])
         self.supergroup_table = self.SqlTable[SupergroupDict](name = 'Supergroup', 
                                                               connection=self.connection, 
-                                                              cursor=self.cursor,table_fields=[('name', 'TEXT NOT NULL PRIMARY KEY'), 
-                                                                                               ('short_name', 'TEXT'), 
-                                                                                               ('description', 'TEXT'), 
-                                                                                               ('website', 'TEXT')],
+                                                              table_fields=[('name', 'TEXT NOT NULL PRIMARY KEY'), 
+                                                                            ('short_name', 'TEXT'), 
+                                                                            ('description', 'TEXT'), 
+                                                                            ('website', 'TEXT')],
                                                               table_constraints=[])
         self.source_table = self.SqlTable[SourceDict](name='Source', 
                                                       connection=self.connection, 
-                                                      cursor=self.cursor,table_fields=[('name', 'TEXT NOT NULL PRIMARY KEY'), 
-                                                                                       ('type', 'TEXT NOT NULL'),
-                                                                                       ('short_name', 'TEXT'), 
-                                                                                       ('description', 'TEXT'), 
-                                                                                       ('parent', 'TEXT'), 
-                                                                                       ('website', 'TEXT')],
-                                                      table_constraints=['FOREIGN KEY(parent) REFERENCES Supergroup(name)'])
+                                                      table_fields=[('name', 'TEXT NOT NULL PRIMARY KEY'), 
+                                                                    ('type', 'TEXT NOT NULL'),
+                                                                    ('short_name', 'TEXT'), 
+                                                                    ('description', 'TEXT'), 
+                                                                    ('parent', 'TEXT'), 
+                                                                    ('website', 'TEXT')],
+                                                      table_constraints=['FOREIGN KEY(parent) REFERENCES Supergroup(name)'],
+                                                      table_indexes=['type', 'parent'])
         self.subgroup_table = self.SqlTable[SubgroupDict](name='Subgroup', 
                                                           connection=self.connection, 
-                                                          cursor=self.cursor,
                                                           table_fields=[('name', 'TEXT NOT NULL PRIMARY KEY'), 
                                                                         ('short_name', 'TEXT'), 
                                                                         ('description', 'TEXT'), 
                                                                         ('parent', 'TEXT NOT NULL'), 
                                                                         ('website', 'TEXT')],
-                                                          table_constraints=['FOREIGN KEY(parent) REFERENCES Source(name)'])
+                                                          table_constraints=['FOREIGN KEY(parent) REFERENCES Source(name)'],
+                                                          table_indexes=['parent'])
         self.pin_table = self.SqlTable[PinDict](name = 'Pin', 
                                                 connection=self.connection, 
-                                                cursor=self.cursor,
                                                 table_fields=[('id', 'INTEGER PRIMARY KEY AUTOINCREMENT'), 
                                                               ('species', 'TEXT NOT NULL'), 
                                                               ('subspecies', 'TEXT'), 
@@ -272,11 +1410,114 @@ class PinDatabaseSQLite3(PinDatabaseInterface):
                                                 table_constraints=['FOREIGN KEY(species) REFERENCES Bird(eBird_code)', 
                                                                    'FOREIGN KEY(subspecies) REFERENCES BirdSubspecies(eBird_code)', 
                                                                    'FOREIGN KEY(source) REFERENCES Source(name)', 
-                                                                   'FOREIGN KEY(subgroup) REFERENCES Subgroup(name)'])
+                                                                   'FOREIGN KEY(subgroup) REFERENCES Subgroup(name)'],
+                                                table_indexes=['species', 'subspecies', 'source', 'subgroup'])
+        self.metadata_table = self.SqlTable[MetadataDict](name = 'Metadata', 
+                                                          connection=self.connection, 
+                                                          table_fields=[('key', 'TEXT NOT NULL PRIMARY KEY'), 
+                                                                        ('value', 'TEXT NOT NULL')],
+                                                          table_constraints=[])
+        self.subspecies_fetch_table = self.SqlTable[SubspeciesFetchDict](name = 'SubspeciesFetch', 
+                                                                         connection=self.connection, 
+                                                                         table_fields=[('species', 'TEXT NOT NULL PRIMARY KEY'), 
+                                                                                       ('fetched_at', 'REAL NOT NULL')],
+                                                                         table_constraints=[])
+        self.bird_bigram_table = self.SqlTable[BigramDict](name = 'BirdBigram', 
+                                                            connection=self.connection, 
+                                                            table_fields=[('bigram', 'TEXT NOT NULL'), 
+                                                                          ('eBird_code', 'TEXT NOT NULL'),
+                                                                          ('occurrences', 'INTEGER NOT NULL DEFAULT 1')],
+                                                            table_constraints=['PRIMARY KEY(bigram, eBird_code)',
+                                                                               'FOREIGN KEY(eBird_code) REFERENCES Bird(eBird_code)'],
+                                                            table_indexes=['eBird_code'])
+        self.bird_search_table = self.SqlTable[SpeciesSearchDict](name = 'BirdSearch', 
+                                                                  connection=self.connection, 
+                                                                  table_fields=[('eBird_code', ''), 
+                                                                                ('common_name', ''), 
+                                                                                ('scientific_name', ''), 
+                                                                                ('family', '')],
+                                                                  table_constraints=["tokenize='trigram'"],
+                                                                  module='fts5')
+        self.collection_statistic_table = self.SqlTable[CollectionStatisticDict](name = 'CollectionStatistic', 
+                                                                                 connection=self.connection, 
+                                                                                 table_fields=[('dimension', 'TEXT NOT NULL'), 
+                                                                                               ('name', 'TEXT NOT NULL'), 
+                                                                                               ('count', 'INTEGER NOT NULL')],
+                                                                                 table_constraints=['PRIMARY KEY(dimension, name)'])
 
     def _open_connection(self) -> None:
+        #One connection per thread (see PinDatabasePool); sqlite3 refuses to share it with another
         self.connection: sql.Connection = sql.connect(DATABASE)
+        self.connection.row_factory = self.DictRowFactory()
         self.cursor: sql.Cursor = self.connection.cursor()
+
+    def _set_pragma(self, name: str, value: str | int) -> None:
+        self.connection.execute(f'PRAGMA {name} = {value}')
+
+    def _execute_sql(self, statement: str, parameters: Sequence = ()) -> None:
+        self.cursor.execute(statement, parameters)
+
+    def _tables(self) -> list['PinDatabaseSQLite3.SqlTable']:
+        return [self.bird_table, self.bird_subspecies_table, self.supergroup_table, 
+                self.source_table, self.subgroup_table, self.pin_table, self.metadata_table,
+                self.subspecies_fetch_table, self.bird_bigram_table, self.bird_search_table,
+                self.collection_statistic_table]
+
+    def find_bigram_matches(self, test_name: str, threshold: int) -> list[str]:
+        query_bigrams: Counter = bigram_counts(test_name)
+        placeholders: str = ','.join('?' * len(query_bigrams))
+        required: dict[int, int] = self._required_bigram_positions(test_name, threshold)
+        #Positions of the shorter name holding a shared bigram: the bird's when it is shorter, else the query's
+        shared_positions: str = (f'''CASE WHEN LENGTH(Bird.search_name) < {len(test_name)} THEN SUM(BirdBigram.occurrences)
+                                     ELSE SUM(CASE BirdBigram.bigram {'WHEN ? THEN ? ' * len(query_bigrams)}END) END''')
+        required_positions: str = (f'''CASE MIN(LENGTH(Bird.search_name), {len(test_name)}) 
+                                       {''.join(f'WHEN {length} THEN {positions} ' for length, positions in required.items())}ELSE 0 END''')
+        rows = self.cursor.execute(f'''SELECT BirdBigram.eBird_code AS eBird_code FROM BirdBigram
+                                       JOIN Bird ON Bird.eBird_code = BirdBigram.eBird_code
+                                       WHERE BirdBigram.bigram IN ({placeholders})
+                                       GROUP BY BirdBigram.eBird_code
+                                       HAVING {shared_positions} >= {required_positions}
+                                       UNION
+                                       SELECT eBird_code FROM Bird WHERE LENGTH(search_name) <= ?''',
+                                   (*query_bigrams, *itertools.chain.from_iterable(query_bigrams.items()), 
+                                    longest_unprunable_length(len(test_name), threshold)))
+        return [row['eBird_code'] for row in rows]
+
+    def search_species(self, query: str, limit: int) -> list[BirdDict]:
+        weights: str = ', '.join(map(str, self.SPECIES_SEARCH_WEIGHTS))
+        return self.cursor.execute(f'''SELECT Bird.* FROM BirdSearch 
+                                       JOIN Bird ON Bird.eBird_code = BirdSearch.eBird_code
+                                       WHERE BirdSearch MATCH ?
+                                       ORDER BY bm25(BirdSearch, {weights})
+                                       LIMIT ?''', (fts_trigram_query(normalise_name(query)), limit)).fetchall()
+
+    def in_transaction(self) -> bool:
+        return not all(table.autocommit for table in self._tables())
+
+    def _check_foreign_keys(self) -> None:
+        violations: list[dict] = self.cursor.execute('PRAGMA foreign_key_check').fetchall()
+        if violations:
+            raise sql.IntegrityError(f'{len(violations)} rows with missing foreign keys, first {violations[0]}')
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        tables: list[PinDatabaseSQLite3.SqlTable] = self._tables()
+        if self.in_transaction():
+            #Already inside a transaction, which will commit for us
+            yield None
+            return None
+        with self.SqlTable.writer_lock:
+            for table in tables:
+                table.autocommit = False
+            try:
+                yield None
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+            finally:
+                for table in tables:
+                    table.autocommit = True
     
     def close_connection(self) -> None:
         self.connection.close()
@@ -286,29 +1527,115 @@ class PinDatabasePeewee(PinDatabaseInterface):
         def __init__(self, database: pw.SqliteDatabase, model: type[pw.Model]):
             self.db = database
             self.model = model
+            primary_key = model._meta.primary_key
+            #Tables with a composite key are keyed by its first column
+            if isinstance(primary_key, pw.CompositeKey):
+                primary_key = model._meta.fields[primary_key.field_names[0]]
+            self.primary_key: pw.Field = primary_key
+
+        def _key_field(self, column: Optional[str]) -> pw.Field:
+            return self.primary_key if column is None else self.model._meta.fields[column]
+
+        def _field(self, column: str) -> pw.Field:
+            if column not in self.model._meta.fields:
+                raise ValueError(f'{self.model._meta.table_name} has no column {column!r}')
+            return self.model._meta.fields[column]
 
         def create(self) -> None:
+            if self.model.table_exists():
+                table_name: str = self.model._meta.table_name
+                existing_columns: set[str] = {column.name for column in self.db.get_columns(table_name)}
+                migrator = SqliteMigrator(self.db)
+                #Primary keys are never added later, and FTS5 tables keep theirs in the implicit rowid
+                migrate(*(migrator.add_column(table_name, field.column_name, field) for field in self.model._meta.sorted_fields 
+                          if not field.primary_key and field.column_name not in existing_columns))
             self.db.create_tables([self.model])
 
         def drop(self) -> None:
             self.db.drop_tables([self.model])
 
-        def add_data(self, data: list[DataDict]) -> None:
-            #Chunk the data to get around SQL insert_many limits
-            chunks = [data[x:x+100] for x in range(0, len(data), 100)]
-            for chunk in chunks:
-                self.model.insert_many(chunk).execute()
+        def clear(self) -> None:
+            self.model.delete().execute()
+
+        def _rows_per_statement(self) -> int:
+            #insert_many binds every column of every row, so stay under SQLite's parameter limit
+            return max(1, sqlite_variable_limit(self.db.connection()) // len(self.model._meta.sorted_fields))
+
+        def add_data(self, data: Iterable[DataDict]) -> None:
+            #One transaction per call, or a savepoint inside an open one, rather than one per chunk
+            with self.db.atomic():
+                for chunk in chunked(data, self._rows_per_statement()):
+                    self.model.insert_many(chunk).execute()
+
+        def replace_data(self, data: Iterable[DataDict]) -> None:
+            with self.db.atomic():
+                for chunk in chunked(data, self._rows_per_statement()):
+                    self.model.insert_many(chunk).on_conflict_replace().execute()
+
+        def update_data(self, changes: dict[Any, dict[str, Any]]) -> None:
+            with self.db.atomic():
+                for key, columns in changes.items():
+                    self.model.update(columns).where(self.primary_key == key).execute()
+
+        def delete_data(self, keys: Iterable[Any], column: Optional[str] = None) -> None:
+            field: pw.Field = self._key_field(column)
+            with self.db.atomic():
+                for chunk in chunked(keys, sqlite_variable_limit(self.db.connection())):
+                    self.model.delete().where(field.in_(chunk)).execute()
 
         @logged()
         def get_data(self) -> list[DataDict]:
-            query = self.model.select()
-            data: list[DataDict] = []
-            for row in query.dicts().iterator():
-                data.append(row)
-            return data
+            return list(self.model.select().dicts())
+
+        def iter_data(self) -> Iterator[DataDict]:
+            #iterator() skips peewee's result cache, so rows are made only as they are read
+            return self.model.select().dicts().iterator()
+
+        def get_records(self, record_type: type[RecordType]) -> list[RecordType]:
+            fields: list[pw.Field] = [self._field(column) for column in record_type.__slots__]
+            return [record_type.from_values(row) for row in self.model.select(*fields).tuples().iterator()]
+
+        def is_empty(self) -> bool:
+            return not self.model.select().exists()
+
+        def get_keys(self) -> list[Any]:
+            return [key for key, in self.model.select(self.primary_key).tuples().iterator()]
+
+        def get_data_by_keys(self, keys: Sequence[Any], column: Optional[str] = None) -> list[DataDict]:
+            field: pw.Field = self._key_field(column)
+            rows: list[DataDict] = []
+            for chunk in chunked(keys, sqlite_variable_limit(self.db.connection())):
+                rows.extend(self.model.select().where(field.in_(chunk)).dicts())
+            return rows
+
+        def query(self, 
+                  where: Optional[dict[str, Any]] = None, 
+                  columns: Optional[Sequence[str]] = None, 
+                  order_by: Optional[Sequence[str]] = None, 
+                  limit: Optional[int] = None) -> list[DataDict]:
+            selection = self.model.select(*map(self._field, columns or []))
+            for column, value in (where or {}).items():
+                field: pw.Field = self._field(column)
+                if value is None:
+                    selection = selection.where(field.is_null())
+                elif isinstance(value, (list, tuple, set, frozenset)):
+                    selection = selection.where(field.in_(list(value)))
+                else:
+                    selection = selection.where(field == value)
+            if order_by:
+                selection = selection.order_by(*(self._field(column[1:]).desc() if column.startswith('-') 
+                                                 else self._field(column).asc() for column in order_by))
+            if limit is not None:
+                selection = selection.limit(limit)
+            return list(selection.dicts())
+
+    #One database per file, shared by every thread: peewee keeps each thread's connection and
+    #transaction apart itself, while the models can only be bound to one database at a time
+    _shared_databases: dict[str, pw.SqliteDatabase] = {}
+    _shared_lock: threading.Lock = threading.Lock()
 
     def __init__(self) -> None:
-        self.db: pw.SqliteDatabase = pw.SqliteDatabase(DATABASE)
+        self.db: pw.SqliteDatabase = self._shared_database()
         super().__init__()
         self.bird_table = self.PeeweeTable[BirdDict](database=self.db, model=Bird)
         self.bird_subspecies_table = self.PeeweeTable[SubspeciesDict](database=self.db, model=BirdSubspecies)
@@ -316,87 +1643,866 @@ class PinDatabasePeewee(PinDatabaseInterface):
         self.source_table = self.PeeweeTable[SourceDict](database=self.db, model=Source)
         self.subgroup_table = self.PeeweeTable[SubgroupDict](database=self.db, model=Subgroup)
         self.pin_table = self.PeeweeTable[PinDict](database=self.db, model=Pin)
+        self.metadata_table = self.PeeweeTable[MetadataDict](database=self.db, model=Metadata)
+        self.subspecies_fetch_table = self.PeeweeTable[SubspeciesFetchDict](database=self.db, model=SubspeciesFetch)
+        self.bird_bigram_table = self.PeeweeTable[BigramDict](database=self.db, model=BirdBigram)
+        self.bird_search_table = self.PeeweeTable[SpeciesSearchDict](database=self.db, model=BirdSearch)
+        self.collection_statistic_table = self.PeeweeTable[CollectionStatisticDict](database=self.db, model=CollectionStatistic)
+
+    @classmethod
+    def _shared_database(cls) -> pw.SqliteDatabase:
+        path: str = os.path.abspath(DATABASE)
+        with cls._shared_lock:
+            if path not in cls._shared_databases:
+                cls._shared_databases[path] = pw.SqliteDatabase(path)
+            database: pw.SqliteDatabase = cls._shared_databases[path]
+            if Bird._meta.database is not database:
+                #Only when another file is opened, which then moves every thread's queries with it
+                database.bind([Bird, BirdSubspecies, Supergroup, Source, Subgroup, Pin, Metadata, SubspeciesFetch, BirdBigram, 
+                               BirdSearch, CollectionStatistic])
+        return database
 
     def _open_connection(self) -> None:
-        self.db.connect()
+        #This thread's connection; any other thread's stays open
+        self.db.connect(reuse_if_open=True)
+
+    #Foreign key columns get an _id suffix in peewee
+    STATISTICS_PIN_COLUMNS: dict[str, str] = {'species': 'species_id', 'source': 'source_id', 'subgroup': 'subgroup_id'}
+
+    def _set_pragma(self, name: str, value: str | int) -> None:
+        self.db.pragma(name, value)
+
+    def _execute_sql(self, statement: str, parameters: Sequence = ()) -> None:
+        self.db.execute_sql(statement, parameters)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self.db.atomic():
+            yield None
+
+    def in_transaction(self) -> bool:
+        return self.db.in_transaction()
+
+    def _check_foreign_keys(self) -> None:
+        violations: list[tuple] = self.db.execute_sql('PRAGMA foreign_key_check').fetchall()
+        if violations:
+            raise pw.IntegrityError(f'{len(violations)} rows with missing foreign keys, first {violations[0]}')
+
+    def find_bigram_matches(self, test_name: str, threshold: int) -> list[str]:
+        query_bigrams: Counter = bigram_counts(test_name)
+        #Positions of the shorter name holding a shared bigram: the bird's when it is shorter, else the query's
+        shared_positions = pw.Case(None, [(pw.fn.LENGTH(Bird.search_name) < len(test_name), pw.fn.SUM(BirdBigram.occurrences))], 
+                                   pw.fn.SUM(pw.Case(BirdBigram.bigram, list(query_bigrams.items()))))
+        required_positions = pw.Case(pw.fn.MIN(pw.fn.LENGTH(Bird.search_name), len(test_name)), 
+                                     list(self._required_bigram_positions(test_name, threshold).items()), 0)
+        matches = (BirdBigram.select(BirdBigram.eBird_code)
+                              .join(Bird, on=(Bird.eBird_code == BirdBigram.eBird_code))
+                              .where(BirdBigram.bigram.in_(list(query_bigrams)))
+                              .group_by(BirdBigram.eBird_code)
+                              .having(shared_positions >= required_positions))
+        short_names = (Bird.select(Bird.eBird_code)
+                           .where(pw.fn.LENGTH(Bird.search_name) <= longest_unprunable_length(len(test_name), threshold)))
+        return [code for code, in (matches | short_names).tuples().iterator()]
+
+    def search_species(self, query: str, limit: int) -> list[BirdDict]:
+        birds = (Bird.select()
+                     .join(BirdSearch, on=(BirdSearch.eBird_code == Bird.eBird_code))
+                     .where(BirdSearch.match(fts_trigram_query(normalise_name(query))))
+                     .order_by(BirdSearch.bm25(*self.SPECIES_SEARCH_WEIGHTS))
+                     .limit(limit))
+        return list(birds.dicts())
 
     def close_connection(self) -> None:
+        #Closes this thread's connection only
         self.db.close()
 
+class PinDatabasePool:
+    '''
+    Open databases handed out by pinDatabaseFactory, one per thread and database file, shared by
+    every bridge on that thread so an action neither reconnects nor rebuilds its tables. SQLite
+    connections belong to the thread that opened them, hence one per thread (the peewee backend
+    shares one database per file beneath, which holds a connection per thread). Each acquire needs
+    a release; a worker thread's database is closed once its last user releases it, while the main
+    thread keeps its open for the next action until close().
+    '''
+    def __init__(self, database_class: Callable[[], PinDatabaseInterface]) -> None:
+        self.database_class: Callable[[], PinDatabaseInterface] = database_class
+        self._local = threading.local()
+
+    def __repr__(self):
+        return '(class) Database pool'
+
+    def _entries(self) -> dict[str, list]:
+        #Keyed on the full path, so changing directory never hands out another file's database
+        if not hasattr(self._local, 'entries'):
+            self._local.entries = {}
+        return self._local.entries
+
+    def acquire(self) -> PinDatabaseInterface:
+        entries: dict[str, list] = self._entries()
+        path: str = os.path.abspath(DATABASE)
+        if path not in entries:
+            entries[path] = [self.database_class(), 0]
+        entries[path][1] += 1
+        return entries[path][0]
+
+    def release(self, database: PinDatabaseInterface) -> None:
+        for path, entry in self._entries().items():
+            if entry[0] is database:
+                entry[1] = max(entry[1] - 1, 0)
+                if entry[1] == 0 and threading.current_thread() is not threading.main_thread():
+                    del self._entries()[path]
+                    database.close_connection()
+                return None
+        #Not acquired on this thread, so not ours to share
+        database.close_connection()
+        return None
+
+    def close(self) -> None:
+        '''Close every database this thread holds, whoever is still using it.'''
+        entries: dict[str, list] = self._entries()
+        for database, users in entries.values():
+            database.close_connection()
+        entries.clear()
+        return None
+
+database_pool: PinDatabasePool = PinDatabasePool(PinDatabaseSQLite3)
+# database_pool: PinDatabasePool = PinDatabasePool(PinDatabasePeewee)
+
 def pinDatabaseFactory() -> PinDatabaseInterface:
-    return PinDatabaseSQLite3()
-    # return PinDatabasePeewee()
+    '''This thread's shared database; hand it back with database_pool.release rather than closing it.'''
+    return database_pool.acquire()
+
+def prepare_database() -> None:
+    '''
+    Bring the pin database up to the current schema on this thread. Run it at startup, before
+    anything reads the database or TaxonomyUpdateScheduler starts, since searches and collection
+    statistics expect the newer columns and tables and would otherwise race the scheduler to them.
+    '''
+    database: PinDatabaseInterface = database_pool.acquire()
+    try:
+        database.upgrade_schema()
+    finally:
+        database_pool.release(database)
+    return None
 
 class EBirdBridge:
-    def __init__(self) ->  None:
-        self.EBirdWeb = EBirdWeb()
+    #Shared by all bridges, so lookups of the same species from different screens or threads are merged
+    _subspecies_requests: SingleFlight = SingleFlight()
+
+    def __init__(self, web: Optional[EBirdWeb] = None) ->  None:
+        self.EBirdWeb = web if web is not None else EBirdWeb()
         self.LocalDBInterface: PinDatabaseInterface = pinDatabaseFactory()
 
     def __repr__(self):
         return '(class) eBird Bridge'
 
-    def update_database(self) -> None:
-        response: Response = self.EBirdWeb.get_data()
-        self.EBirdWeb.status_test(response=response, 
-                                    success_function=self.LocalDBInterface.update_ebird_data, 
-                                    failure_function=self.EBirdWeb.throw_connection_error)
+    def _local_taxonomy_version(self) -> Optional[float]:
+        stored_version: Optional[str] = self.LocalDBInterface.get_metadata('taxonomy_version')
+        if stored_version is None:
+            return None
+        return float(stored_version)
+
+    def _record_taxonomy_version(self, version: Optional[float]) -> None:
+        if version is not None:
+            self.LocalDBInterface.set_metadata('taxonomy_version', str(version))
+
+    def _reload_from_cache(self, remote_version: Optional[float]) -> UpdateReport:
+        self._record_taxonomy_version(remote_version)
+        if not self.LocalDBInterface.bird_table.is_empty():
+            return {'cache': 'hit', 'updated': False, 'taxonomy_version': remote_version, 'changes': None}
+        #The local table was lost since the last download, so rebuild it from the cached copy
+        cached_data: Optional[Iterator[dict]] = self.EBirdWeb.iter_cached_taxonomy()
+        if cached_data is None:
+            return self.update_database(force=True)
+        changes: TaxonomyChanges = self.LocalDBInterface.update_ebird_data(cached_data)
+        return {'cache': 'hit', 'updated': True, 'taxonomy_version': remote_version, 'changes': changes}
+
+    def _store_taxonomy(self, digest: str, response: Response, 
+                        remote_version: Optional[float], force: bool) -> UpdateReport:
+        if not force and self.EBirdWeb.taxonomy_unchanged(response, digest):
+            self.EBirdWeb.discard_taxonomy()
+            return self._reload_from_cache(remote_version)
+        try:
+            changes: TaxonomyChanges = self.LocalDBInterface.update_ebird_data(self.EBirdWeb.iter_downloaded_taxonomy())
+        except Exception:
+            self.EBirdWeb.discard_taxonomy()
+            raise
+        self.EBirdWeb.commit_taxonomy(response, digest)
+        self._record_taxonomy_version(remote_version)
+        return {'cache': 'miss', 'updated': True, 'taxonomy_version': remote_version, 'changes': changes}
+
+    def update_database(self, force: bool = False) -> UpdateReport:
+        self.LocalDBInterface.upgrade_schema()
+        #The versions list is a few bytes, so check it before pulling the multi-MB taxonomy
+        remote_version: Optional[float] = self.EBirdWeb.get_taxonomy_version()
+        local_version: Optional[float] = self._local_taxonomy_version()
+        if (not force 
+            and remote_version is not None 
+            and local_version is not None 
+            and remote_version <= local_version
+            and not self.LocalDBInterface.bird_table.is_empty()):
+            return {'cache': 'skipped', 'updated': False, 'taxonomy_version': local_version, 'changes': None}
+        response: Optional[Response] = self.EBirdWeb.get_data(conditional=not force)
+        if response is None:
+            return {'cache': 'miss', 'updated': False, 'taxonomy_version': local_version, 'changes': None}
+        #Closed on every path, as an unread streamed body keeps its pooled connection checked out,
+        #and before reloading from the cache, which may need a connection of its own
+        with response:
+            unchanged: bool = not force and self.EBirdWeb.taxonomy_unchanged(response)
+            report: Optional[UpdateReport] = None
+            if not unchanged:
+                report = self.EBirdWeb.status_test(response=response, 
+                                                   success_function=lambda digest: self._store_taxonomy(digest, response, remote_version, force), 
+                                                   failure_function=self.EBirdWeb.throw_connection_error,
+                                                   parser=self.EBirdWeb.download_taxonomy)
+        if unchanged:
+            return self._reload_from_cache(remote_version)
+        if report is None:
+            return {'cache': 'miss', 'updated': False, 'taxonomy_version': local_version, 'changes': None}
+        return report
         
-    def retrieve_subspecies(self, species_code: str) -> Optional[list[SubspeciesDict]]:
-        data = self.EBirdWeb.get_subspecies_data(species_code)
+    def _prefetch_group(self, species_codes: list[str], pool: ThreadPoolExecutor) -> tuple[list[SubspeciesDict], set[str]]:
+        '''Fetch the forms of a group of species, returning their rows and the species that fully succeeded.'''
+        forms: dict[str, Optional[list[str]]] = dict(zip(species_codes, pool.map(self.EBirdWeb.get_subspecies_codes, species_codes)))
+        succeeded: set[str] = {code for code, form_codes in forms.items() if form_codes is not None}
+        parent_of: dict[str, str] = {form_code: code for code, form_codes in forms.items() 
+                                     for form_code in form_codes or []}
+        parent_of.update({code: code for code in succeeded})
+        batches: list[list[str]] = list(self.EBirdWeb.batch_species_codes(parent_of))
+        rows: list[SubspeciesDict] = []
+        for batch, batch_rows in zip(batches, pool.map(self.EBirdWeb.get_filtered_subspecies_data, batches)):
+            if batch_rows is None:
+                succeeded.difference_update(parent_of[form_code] for form_code in batch)
+                continue
+            rows.extend(batch_rows)
+        return [row for row in rows if parent_of.get(row['eBird_code']) in succeeded], succeeded
+
+    def prefetch_subspecies(self, 
+                            max_workers: int = 4, 
+                            requests_per_second: float = 5, 
+                            checkpoint_size: int = 100,
+                            resume: bool = True) -> PrefetchReport:
+        '''
+        Fill BirdSubspecies for every species in Bird. Lookups run on a bounded thread pool
+        under a global rate limit, and each group of `checkpoint_size` species is written
+        together with its SubspeciesFetch entries, so an interrupted run resumes where it stopped.
+        '''
+        database: PinDatabaseInterface = self.LocalDBInterface
+        species_codes: list[str] = database.bird_table.get_keys()
+        done: set[str] = set(database.subspecies_fetch_table.get_keys()) if resume else set()
+        pending: list[str] = [code for code in species_codes if code not in done]
+        report: PrefetchReport = {'species_fetched': 0, 
+                                  'species_failed': 0, 
+                                  'species_skipped': len(species_codes) - len(pending), 
+                                  'subspecies_stored': 0}
+        previous_limiter: Optional[RateLimiter] = self.EBirdWeb.rate_limiter
+        self.EBirdWeb.rate_limiter = RateLimiter(requests_per_second, burst=max_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='subspecies-prefetch') as pool:
+                for group in chunked(pending, checkpoint_size):
+                    rows, succeeded = self._prefetch_group(group, pool)
+                    fetched_at: float = time.time()
+                    #Only this thread touches the database; the pool only makes requests
+                    with database.transaction():
+                        database.bird_subspecies_table.replace_data(rows)
+                        database.subspecies_fetch_table.replace_data({'species': code, 'fetched_at': fetched_at} 
+                                                                     for code in succeeded)
+                    report['species_fetched'] += len(succeeded)
+                    report['species_failed'] += len(group) - len(succeeded)
+                    report['subspecies_stored'] += len(rows)
+                    logger.info(f'Subspecies prefetch progress: {report}')
+        finally:
+            self.EBirdWeb.rate_limiter = previous_limiter
+        return report
+
+    def _cached_subspecies(self, species_code: str) -> tuple[Optional[float], list[SubspeciesDict]]:
+        database: PinDatabaseInterface = self.LocalDBInterface
+        fetches: list[SubspeciesFetchDict] = database.subspecies_fetch_table.get_data_by_keys([species_code])
+        if not fetches:
+            return None, []
+        return fetches[0]['fetched_at'], database.bird_subspecies_table.get_data_by_keys([species_code], column='species')
+
+    def _store_subspecies(self, species_code: str, subspecies: list[SubspeciesDict]) -> None:
+        database: PinDatabaseInterface = self.LocalDBInterface
+        with database.transaction():
+            outdated_rows: list[SubspeciesDict] = database.bird_subspecies_table.get_data_by_keys([species_code], column='species')
+            database.bird_subspecies_table.delete_data(row['eBird_code'] for row in outdated_rows)
+            database.bird_subspecies_table.replace_data(subspecies)
+            database.subspecies_fetch_table.replace_data([{'species': species_code, 'fetched_at': time.time()}])
+
+    def retrieve_subspecies(self, species_code: str, max_age: float = SUBSPECIES_MAX_AGE) -> Optional[list[SubspeciesDict]]:
+        '''
+        Serve subspecies from BirdSubspecies when they were fetched within `max_age` seconds,
+        otherwise ask eBird. Concurrent lookups of one species share a single request and a single
+        write of its result, and a stale local copy is still returned if eBird cannot be reached.
+        '''
+        fetched_at, cached = self._cached_subspecies(species_code)
+        if fetched_at is not None and time.time() - fetched_at < max_age:
+            return cached
+        data: Optional[list[SubspeciesDict]] = self._subspecies_requests.do(species_code, 
+                                                                            lambda: self._fetch_subspecies(species_code))
+        if data is None:
+            return cached if fetched_at is not None else None
+        return data
+
+    def _fetch_subspecies(self, species_code: str) -> Optional[list[SubspeciesDict]]:
+        '''Ask eBird and store what it sends, run only by the caller leading a shared lookup.'''
+        data: Optional[list[SubspeciesDict]] = self.EBirdWeb.get_subspecies_data(species_code)
+        if data is not None:
+            self._store_subspecies(species_code, data)
         return data
    
     def close_connection(self) -> None:
-        self.LocalDBInterface.close_connection()
+        self.EBirdWeb.close()
+        database_pool.release(self.LocalDBInterface)
+
+
+class TaxonomyUpdateScheduler:
+    '''
+    Runs EBirdBridge.update_database on a background thread, once at start and then every
+    `interval` seconds if one is given. The thread opens its own bridge, since SQLite
+    connections cannot be shared across threads.
+    '''
+    def __init__(self, 
+                 interval: Optional[float] = None, 
+                 on_update: Optional[Callable[[UpdateReport], None]] = None) -> None:
+        self.interval: Optional[float] = interval
+        self.on_update: Optional[Callable[[UpdateReport], None]] = on_update
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __repr__(self):
+        return '(class) Taxonomy update scheduler'
 
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return None
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='taxonomy-update', daemon=True)
+        self._thread.start()
+        return None
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self._check()
+            if self.interval is None or self._stop_event.wait(self.interval):
+                break
+        return None
+
+    def _check(self) -> None:
+        try:
+            bridge = EBirdBridge()
+            try:
+                report: UpdateReport = bridge.update_database()
+            finally:
+                bridge.close_connection()
+        except Exception as err:
+            logger.exception(f'Background taxonomy update failed: {err}')
+            return None
+        logger.info(f'Background taxonomy update: {report}')
+        if self.on_update is not None:
+            self.on_update(report)
+        return None
+
+
+class SpeciesCache:
+    '''
+    Bird rows, and the candidates found for recent searches, shared by every bridge in the process
+    that opens the same database file. Everything is rebuilt once PinDatabaseInterface.taxonomy_generation
+    moves on. With `compact`, birds are held as read-only BirdRecords rather than dicts, so searches
+    hand back BirdRecords too.
+    '''
+    #Searches whose candidates are remembered
+    MEMO_SIZE: int = 256
+    #One cache per database file, keyed on the full path
+    _shared_caches: dict[str, 'SpeciesCache'] = {}
+    _shared_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, compact: bool = False) -> None:
+        self._lock = threading.Lock()
+        self.compact: bool = compact
+        self._generation: Optional[int] = None
+        self._birds: list[BirdDict | BirdRecord] = []
+        self._birds_by_code: dict[str, BirdDict | BirdRecord] = {}
+        #None means the search could not narrow the taxonomy down
+        self._candidates: OrderedDict[tuple, Optional[list[str]]] = OrderedDict()
+        self._stats: SpeciesCacheStats = {'hits': 0, 'misses': 0, 'rebuilds': 0, 'generation': 0}
+
+    def __repr__(self):
+        return '(class) Species cache'
+
+    @classmethod
+    def for_database(cls, path: str) -> 'SpeciesCache':
+        '''The cache shared by every bridge on the database file at path.'''
+        path = os.path.abspath(path)
+        with cls._shared_lock:
+            if path not in cls._shared_caches:
+                cls._shared_caches[path] = cls(compact=SPECIES_CACHE_COMPACT)
+            return cls._shared_caches[path]
+
+    def _refresh(self, bird_table: Table[BirdDict]) -> None:
+        #Read the generation first, so an update committing mid-load triggers another rebuild
+        generation: int = PinDatabaseInterface.taxonomy_generation
+        if self._generation == generation:
+            return None
+        self._birds = bird_table.get_records(BirdRecord) if self.compact else bird_table.get_data()
+        self._birds_by_code = {bird['eBird_code']: bird for bird in self._birds}
+        self._candidates.clear()
+        self._generation = generation
+        self._stats['rebuilds'] += 1
+        self._stats['generation'] = generation
+        return None
+
+    def birds(self, bird_table: Table[BirdDict]) -> list[BirdDict]:
+        with self._lock:
+            self._stats['hits' if self._generation == PinDatabaseInterface.taxonomy_generation else 'misses'] += 1
+            self._refresh(bird_table)
+            return self._birds
+
+    def candidates(self, bird_table: Table[BirdDict], key: tuple, 
+                   find_codes: Callable[[], Optional[list[str]]]) -> Optional[list[BirdDict]]:
+        '''Birds for the codes find_codes gives for this search, in order, only calling it for new searches.'''
+        with self._lock:
+            self._refresh(bird_table)
+            generation: Optional[int] = self._generation
+            hit: bool = key in self._candidates
+            if hit:
+                self._candidates.move_to_end(key)
+                codes: Optional[list[str]] = self._candidates[key]
+            self._stats['hits' if hit else 'misses'] += 1
+        if not hit:
+            codes = find_codes()
+            with self._lock:
+                if self._generation == generation:
+                    self._candidates[key] = codes
+                    if len(self._candidates) > self.MEMO_SIZE:
+                        self._candidates.popitem(last=False)
+        if codes is None:
+            return None
+        birds_by_code: dict[str, BirdDict] = self._birds_by_code
+        return [birds_by_code[code] for code in codes if code in birds_by_code]
+
+    def stats(self) -> SpeciesCacheStats:
+        with self._lock:
+            return {**self._stats}
+
+class SpeciesNameIndex:
+    '''
+    In-memory bigram index over species search names, the same pruning find_bigram_matches
+    does in SQL, for matching many names without a query per name. Small enough to pickle
+    once into each worker of a process pool.
+    >>> SpeciesNameIndex(['rock pigeon', 'rameron pigeon', 'emu']).best_matches('Maroon Pigeon', limit=1, threshold=80)
+    [(1, 88)]
+    '''
+    def __init__(self, search_names: Sequence[str]) -> None:
+        self.search_names: list[str] = list(search_names)
+        #Names listed once per time the bigram appears in them
+        self.postings: dict[str, list[int]] = {}
+        for position, search_name in enumerate(self.search_names):
+            for bigram, occurrences in bigram_counts(search_name).items():
+                self.postings.setdefault(bigram, []).extend([position] * occurrences)
+
+    def __repr__(self):
+        return '(class) Species name index'
+
+    def candidates(self, search_name: str, threshold: int) -> list[int]:
+        '''Positions of names that could reach threshold against search_name, in index order.'''
+        if min_shared_bigrams(len(search_name), threshold) <= 0:
+            return list(range(len(self.search_names)))
+        #Positions of each name, and of search_name, holding a bigram the other has
+        name_positions: Counter = Counter()
+        query_positions: Counter = Counter()
+        for bigram, occurrences in bigram_counts(search_name).items():
+            postings: list[int] = self.postings.get(bigram, [])
+            name_positions.update(postings)
+            query_positions.update(dict.fromkeys(postings, occurrences))
+        short_length: int = longest_unprunable_length(len(search_name), threshold)
+        return [position for position, name in enumerate(self.search_names) 
+                if len(name) <= short_length 
+                or (name_positions[position] if len(name) < len(search_name) else query_positions[position]) 
+                    >= min_shared_bigrams(min(len(name), len(search_name)), threshold)]
+
+    def best_matches(self, name: str, limit: int, threshold: int) -> list[tuple[int, int]]:
+        '''(position, score) of the best `limit` names for name, highest score first.'''
+        search_name: str = normalise_name(name)
+        positions: list[int] = self.candidates(search_name, threshold)
+        database: list[dict[str, int | str]] = [{'search_name': self.search_names[position], 'position': position} 
+                                                for position in positions]
+        matches = UserBridge().top_matches(search_name, database, 'search_name', limit=limit, 
+                                           threshold=threshold, normalised=True)
+        return [(match['position'], score) for match, score in matches]
+
+#Each batch matching worker process unpickles the index once, rather than once per chunk
+_worker_name_index: Optional[SpeciesNameIndex] = None
+
+def _start_name_match_worker(index: SpeciesNameIndex) -> None:
+    global _worker_name_index
+    _worker_name_index = index
+    return None
+
+def _match_name_chunk(names: list[str], limit: int, threshold: int) -> list[list[tuple[int, int]]]:
+    return [_worker_name_index.best_matches(name, limit, threshold) for name in names]
 
 class UserBridge:
     def fuzzy_search(self, test_name: str, 
                             database: Sequence[DataDict], 
                             attribute: str,
-                            threshold: int = 80) -> list[DictWithScore[DataDict]]:
+                            threshold: int = 80,
+                            normalised: bool = False) -> list[DictWithScore[DataDict]]:
         '''
-        >>> UserLocalDBBridge.species_fuzzy_search(test_name = 'Maroon Pigeon', database = [{'common_name': 'Short-toed Coucal'}, {'common_name': 'Rameron Pigeon'}], check_type = 'common_name')
-        [({'common_name': 'Rameron Pigeon'},85)]
+        With `normalised`, attribute holds search keys from normalise_name, which test_name is matched through.
+        >>> UserBridge().fuzzy_search(test_name = 'Maroon Pigeon', database = [{'common_name': 'Short-toed Coucal'}, {'common_name': 'Rameron Pigeon'}], attribute = 'common_name')
+        [({'common_name': 'Rameron Pigeon'}, 88)]
         '''
 
         matching_data: list[DictWithScore] = []
+        lowered_name: str = normalise_name(test_name) if normalised else test_name.lower()
+        name_counts: Counter = Counter(lowered_name)
         for data in database:
-            ratio = fuzz.partial_ratio(test_name.lower(),str(data.get(attribute)).lower())
+            value: str = data.get(attribute) if normalised else str(data.get(attribute)).lower()
+            #A fraction of partial_ratio's cost, and it rules out most names
+            if _partial_ratio_upper_bound(name_counts, lowered_name, value) < threshold:
+                continue
+            ratio = fuzz.partial_ratio(lowered_name, value)
             if ratio >= threshold:
                 matching_data.append((data,ratio))
         return matching_data
 
+    def top_matches(self, test_name: str, 
+                          database: Sequence[DataDict], 
+                          attribute: str,
+                          limit: int = 10,
+                          offset: int = 0,
+                          threshold: int = 80,
+                          normalised: bool = False) -> list[DictWithScore[DataDict]]:
+        '''
+        Matches ranked offset to offset + limit, best first, ties in database order. Candidates are
+        streamed once through a heap of the offset + limit best so far, and only scored when their
+        partial_ratio_upper_bound could displace the worst of those, so memory stays O(offset + limit).
+        >>> UserBridge().top_matches(test_name = 'Pigeon', database = [{'common_name': 'Short-toed Coucal'}, {'common_name': 'Rameron Pigeon'}, {'common_name': 'Rock Pigeon'}], attribute = 'common_name', limit = 1, offset = 1)
+        [({'common_name': 'Rock Pigeon'}, 100)]
+        '''
+        lowered_name: str = normalise_name(test_name) if normalised else test_name.lower()
+        name_counts: Counter = Counter(lowered_name)
+        kept: int = offset + limit
+        #Min-heap of (score, -index), so the worst match kept, and the later of equals, is on top
+        heap: list[tuple[int, int]] = []
+        for index, data in enumerate(database):
+            #Later candidates lose ties, so once every match kept scores 100 none can displace them
+            if len(heap) == kept and heap[0][0] == 100:
+                break
+            value: str = data.get(attribute) if normalised else str(data.get(attribute)).lower()
+            bound: int = _partial_ratio_upper_bound(name_counts, lowered_name, value)
+            if bound < threshold or (len(heap) == kept and bound <= heap[0][0]):
+                continue
+            ratio: int = fuzz.partial_ratio(lowered_name, value)
+            if ratio < threshold:
+                continue
+            if len(heap) < kept:
+                heapq.heappush(heap, (ratio, -index))
+            elif ratio > heap[0][0]:
+                heapq.heapreplace(heap, (ratio, -index))
+        ranked: list[tuple[int, int]] = sorted(heap, reverse=True)[offset:]
+        return [(database[-negative_index], ratio) for ratio, negative_index in ranked]
+
 class UserLocalDBBridge(UserBridge):
-    def __init__(self) -> None:
+    #Best bm25 matches re-scored in Python by the fts5 engine
+    FTS_CANDIDATES: int = 50
+
+    def __init__(self, search_engine: SpeciesSearchEngine = SPECIES_SEARCH_ENGINE) -> None:
         self.LocalDBInterface: PinDatabaseInterface = pinDatabaseFactory()
         self.eBirdDB: Table[BirdDict] = self.LocalDBInterface.bird_table
+        #Shared by all bridges on this file, so repeat searches from any screen are answered from memory
+        self.species_cache: SpeciesCache = SpeciesCache.for_database(DATABASE)
+        self.search_engine: SpeciesSearchEngine = search_engine
         super().__init__()
 
     def __repr__(self):
         return '(class) Local Database Bridge'
 
-    def fuzzy_search_species_ebird(self, test_name: str, threshold: int = 80) -> list[DictWithScore[BirdDict]]:
-        database: list[BirdDict] = self.eBirdDB.get_data()
-        return self.fuzzy_search(test_name=test_name, database=database, attribute='common_name', threshold=threshold)
+    def _find_bigram_candidates(self, test_name: str, threshold: int) -> Optional[list[str]]:
+        if self.LocalDBInterface.bird_bigram_table.is_empty():
+            return None
+        return self.LocalDBInterface.find_bigram_matches(test_name, threshold)
+
+    def _species_candidates(self, test_name: str, threshold: int) -> list[BirdDict]:
+        '''Birds that could reach the threshold, narrowed with the bigram index where it can rule names out.'''
+        search_name: str = normalise_name(test_name)
+        candidates: Optional[list[BirdDict]] = None
+        if min_shared_bigrams(len(search_name), threshold) > 0:
+            candidates = self.species_cache.candidates(self.eBirdDB, ('bigram', search_name, threshold), 
+                                                       lambda: self._find_bigram_candidates(search_name, threshold))
+        return self.species_cache.birds(self.eBirdDB) if candidates is None else candidates
+
+    def _find_fts_candidates(self, test_name: str) -> Optional[list[str]]:
+        if not self.LocalDBInterface.species_search_available() or self.LocalDBInterface.bird_search_table.is_empty():
+            return None
+        return [bird['eBird_code'] for bird in self.LocalDBInterface.search_species(test_name, self.FTS_CANDIDATES)]
+
+    def _search_species_fts(self, test_name: str, candidates: list[BirdDict], threshold: int) -> list[DictWithScore[BirdDict]]:
+        '''Re-score the best bm25 matches by their closest field.'''
+        search_name: str = normalise_name(test_name)
+        matching_data: list[DictWithScore[BirdDict]] = []
+        for bird in candidates:
+            fields: tuple[str, ...] = (f"{bird['genus']} {bird['species']}", bird['family_common_name'], bird['family'], bird['eBird_code'])
+            ratio: int = max(fuzz.partial_ratio(search_name, bird['search_name']), 
+                             *(fuzz.partial_ratio(search_name, field.lower()) for field in fields))
+            if ratio >= threshold:
+                matching_data.append((bird, ratio))
+        #Stable, so equal scores keep their bm25 order
+        matching_data.sort(key=lambda match: match[1], reverse=True)
+        return matching_data
+
+    def _fts_matches(self, test_name: str, threshold: int) -> Optional[list[DictWithScore[BirdDict]]]:
+        '''Ranked matches from the fts5 engine, or None where it is not in use or cannot answer.'''
+        #Queries under three characters have no trigrams for FTS5 to match on
+        if self.search_engine != 'fts5' or len(test_name) < 3:
+            return None
+        fts_candidates: Optional[list[BirdDict]] = self.species_cache.candidates(self.eBirdDB, ('fts5', normalise_name(test_name)), 
+                                                                                 lambda: self._find_fts_candidates(test_name))
+        if fts_candidates is None:
+            return None
+        return self._search_species_fts(test_name, fts_candidates, threshold)
+
+    def _find_phonetic_matches(self, key: str) -> list[str]:
+        return [bird['eBird_code'] for bird in self.eBirdDB.get_data_by_keys([key], column='phonetic_key')]
+
+    def _with_phonetic_matches(self, test_name: str, matching_data: list[DictWithScore[BirdDict]], 
+                               threshold: int) -> list[DictWithScore[BirdDict]]:
+        '''Add birds whose whole name sounds like test_name, scored at least the threshold however it is spelt.'''
+        key: str = phonetic_key(test_name)
+        if not key:
+            return matching_data
+        sounds_alike: list[BirdDict] = self.species_cache.candidates(self.eBirdDB, ('phonetic', key), 
+                                                                     lambda: self._find_phonetic_matches(key)) or []
+        matched_codes: set[str] = {bird['eBird_code'] for bird, score in matching_data}
+        search_name: str = normalise_name(test_name)
+        return matching_data + [(bird, max(threshold, fuzz.partial_ratio(search_name, bird['search_name']))) 
+                                for bird in sounds_alike if bird['eBird_code'] not in matched_codes]
+
+    def fuzzy_search_species_ebird(self, test_name: str, threshold: int = 80, phonetic: bool = False) -> list[DictWithScore[BirdDict]]:
+        matching_data: Optional[list[DictWithScore[BirdDict]]] = self._fts_matches(test_name, threshold)
+        if matching_data is None:
+            database: list[BirdDict] = self._species_candidates(test_name, threshold)
+            matching_data = self.fuzzy_search(test_name=test_name, database=database, attribute='search_name', 
+                                              threshold=threshold, normalised=True)
+        return self._with_phonetic_matches(test_name, matching_data, threshold) if phonetic else matching_data
+
+    def top_species_ebird(self, test_name: str, limit: int = 10, offset: int = 0, 
+                          threshold: int = 80, phonetic: bool = False) -> list[DictWithScore[BirdDict]]:
+        '''fuzzy_search_species_ebird, ranked best first and paged.'''
+        matching_data: Optional[list[DictWithScore[BirdDict]]] = self._fts_matches(test_name, threshold)
+        if matching_data is None:
+            database: list[BirdDict] = self._species_candidates(test_name, threshold)
+            #Anything ranked on this page is either in the leading offset + limit or sounds alike
+            matching_data = self.top_matches(test_name=test_name, database=database, attribute='search_name', 
+                                             limit=offset + limit, threshold=threshold, normalised=True)
+        if phonetic:
+            matching_data = self._with_phonetic_matches(test_name, matching_data, threshold)
+            matching_data.sort(key=lambda match: match[1], reverse=True)
+        return matching_data[offset:offset + limit]
+
+    def match_names(self, names: Iterable[str], 
+                          limit: int = 3, 
+                          threshold: int = 80, 
+                          workers: Optional[int] = None, 
+                          chunk_size: int = 200) -> Iterator[NameMatch]:
+        '''
+        Match a stream of names, such as a supplier's pin list, against the taxonomy. The index
+        is built once and chunks of names are scored across `workers` processes (all cores by
+        default, none with 1). Results keep the order of names and are yielded as chunks finish,
+        with at most two chunks per worker in flight.
+        '''
+        birds: list[BirdDict] = self.species_cache.birds(self.eBirdDB)
+        index: SpeciesNameIndex = SpeciesNameIndex([bird['search_name'] for bird in birds])
+
+        def results(chunk: list[str], chunk_matches: list[list[tuple[int, int]]]) -> Iterator[NameMatch]:
+            for name, matches in zip(chunk, chunk_matches):
+                yield name, [birds[position] for position, score in matches], [score for position, score in matches]
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            _start_name_match_worker(index)
+            for chunk in chunked(names, chunk_size):
+                yield from results(chunk, _match_name_chunk(chunk, limit, threshold))
+            return None
+        with ProcessPoolExecutor(max_workers=workers, initializer=_start_name_match_worker, initargs=(index,)) as pool:
+            in_flight: deque[tuple[list[str], Future]] = deque()
+            for chunk in chunked(names, chunk_size):
+                in_flight.append((chunk, pool.submit(_match_name_chunk, chunk, limit, threshold)))
+                if len(in_flight) >= 2 * workers:
+                    chunk, future = in_flight.popleft()
+                    yield from results(chunk, future.result())
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                yield from results(chunk, future.result())
+        return None
+
+    def search_session(self, threshold: int = 80, limit: int = 10) -> 'SpeciesSearchSession':
+        return SpeciesSearchSession(self, threshold=threshold, limit=limit)
 
     def retrieve_sources(self, source_type: Literal['Charity', 'Artist', 'Other']) -> list[SourceDict]:
-        unfiltered_data: list[SourceDict] = self.LocalDBInterface.source_table.get_data()
-        filtered_data: list[SourceDict] = []
-        for source in filter(lambda x: x['type'] == source_type, unfiltered_data):
-            filtered_data.append(source)
-        return filtered_data
+        return self.LocalDBInterface.source_table.query(where={'type': source_type})
     
     def retrieve_subgroups(self, source: str) -> list[SubgroupDict]:
-        unfiltered_data: list[SubgroupDict] = self.LocalDBInterface.subgroup_table.get_data()
-        filtered_data: list[SubgroupDict] = []
-        for subgroup in filter(lambda x: x['parent'] == source, unfiltered_data):
-            filtered_data.append(subgroup)
-        return filtered_data
+        return self.LocalDBInterface.subgroup_table.query(where={'parent': source})
+
+    def add_pin(self, species: BirdDict, subspecies: Optional[SubspeciesDict], source: str, subgroup: Optional[str]) -> PinDict:
+        '''Store a pin of a species, and optionally subspecies, picked from a search, by their eBird codes.'''
+        pin: PinDict = {'id': None,
+                        'species': species['eBird_code'],
+                        'subspecies': None if subspecies is None else subspecies['eBird_code'],
+                        'source': source,
+                        'subgroup': subgroup}
+        self.LocalDBInterface.pin_table.add_data([pin])
+        return pin
+
+    def _collection_statistics(self, dimension: str) -> dict[str, int]:
+        #Groups whose last pin has gone keep a row at zero
+        return {row['name']: row['count'] for row in self.LocalDBInterface.collection_statistic_table.query(
+                    where={'dimension': dimension}, columns=['name', 'count'], order_by=['name']) if row['count']}
+
+    def pin_counts(self, dimension: StatisticDimension) -> dict[str, int]:
+        '''
+        Pins per species, source, subgroup, order or family, read from counts that triggers keep
+        up to date, so the cost goes with the number of groups rather than of pins.
+        '''
+        return self._collection_statistics(dimension)
+
+    def family_coverage(self) -> list[FamilyCoverage]:
+        '''How many of each family's species have at least one pin.'''
+        pinned_species: dict[str, int] = self._collection_statistics('family_pinned_species')
+        return [{'family': family, 'species': species, 'pinned_species': pinned_species.get(family, 0)} 
+                for family, species in self._collection_statistics('family_species').items()]
     
 
 
     def close_connection(self) -> None:
-        self.LocalDBInterface.close_connection()
+        database_pool.release(self.LocalDBInterface)
+        return None
+
+class SpeciesSearchSession:
+    '''
+    Search-as-you-type over species search names for one entry box. Each keystroke scores only
+    the bigram candidates for the query, and of those only the birds whose character counts
+    could still reach the threshold, which partial_ratio_upper_bound decides far faster than
+    partial_ratio itself. Both prunings are exact, so results match a full scan.
+    '''
+    #The bigram index cannot narrow shorter queries at the default threshold
+    MIN_QUERY_LENGTH: int = 3
+
+    def __init__(self, bridge: UserLocalDBBridge, threshold: int = 80, limit: int = 10) -> None:
+        self.bridge: UserLocalDBBridge = bridge
+        self.threshold: int = threshold
+        self.limit: int = limit
+        self._query: Optional[str] = None
+        self._candidates: list[BirdDict] = []
+
+    def __repr__(self):
+        return '(class) Species search session'
+
+    def search(self, query: str) -> list[DictWithScore[BirdDict]]:
+        '''The best `limit` matches for query, highest score first.'''
+        lowered_query: str = normalise_name(query)
+        if len(lowered_query) < self.MIN_QUERY_LENGTH:
+            self._query, self._candidates = None, []
+            return []
+        extends: bool = self._query is not None and lowered_query.startswith(self._query)
+        candidates: list[BirdDict]
+        if extends and min_shared_bigrams(len(lowered_query), self.threshold) <= 0:
+            #The index cannot narrow this query, so stay with the birds found for the last one
+            candidates = self._candidates
+        else:
+            candidates = self.bridge._species_candidates(lowered_query, self.threshold)
+        query_counts: Counter = Counter(lowered_query)
+        matching_data: list[DictWithScore[BirdDict]] = []
+        for bird in candidates:
+            if _partial_ratio_upper_bound(query_counts, lowered_query, bird['search_name']) < self.threshold:
+                continue
+            ratio: int = fuzz.partial_ratio(lowered_query, bird['search_name'])
+            if ratio >= self.threshold:
+                matching_data.append((bird, ratio))
+        self._query, self._candidates = lowered_query, candidates
+        matching_data.sort(key=lambda match: (-match[1], match[0]['common_name']))
+        return matching_data[:self.limit]
+
+    def close(self) -> None:
+        self.bridge.close_connection()
+        return None
+
+class SpeciesSearchWorker:
+    '''
+    Runs a SpeciesSearchSession on its own thread, so scoring never holds up the caller, such
+    as a Tk main loop. Only the latest query submitted is searched, older ones still waiting
+    are dropped, and the caller polls `result` for the outcome. The thread opens its own
+    bridge, since SQLite connections cannot be shared across threads.
+    '''
+    def __init__(self, threshold: int = 80, limit: int = 10) -> None:
+        self.threshold: int = threshold
+        self.limit: int = limit
+        self._condition = threading.Condition()
+        self._query: Optional[str] = None
+        self._result: Optional[tuple[str, list[DictWithScore[BirdDict]]]] = None
+        self._stopped: bool = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __repr__(self):
+        return '(class) Species search worker'
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='species-search', daemon=True)
+        self._thread.start()
+        return None
+
+    def submit(self, query: str) -> None:
+        with self._condition:
+            self._query = query
+            self._condition.notify()
+        return None
+
+    def result(self) -> Optional[tuple[str, list[DictWithScore[BirdDict]]]]:
+        '''The last query searched and its matches, handed out once, or None until a search finishes.'''
+        with self._condition:
+            result, self._result = self._result, None
+        return result
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return None
+
+    def _run(self) -> None:
+        session: SpeciesSearchSession = UserLocalDBBridge().search_session(threshold=self.threshold, limit=self.limit)
+        try:
+            while True:
+                with self._condition:
+                    while self._query is None and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        break
+                    query, self._query = self._query, None
+                try:
+                    matches: list[DictWithScore[BirdDict]] = session.search(query)
+                except Exception as err:
+                    logger.exception(f'Species search for {query!r} failed: {err}')
+                    matches = []
+                with self._condition:
+                    self._result = (query, matches)
+        finally:
+            session.close()
         return None
 
 @logged()
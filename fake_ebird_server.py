@@ -0,0 +1,322 @@
+#Local HTTP server
+import http.server
+import threading
+import urllib.parse
+#Fixtures and fault injection
+import hashlib
+import json
+import os
+import random
+import tempfile
+#Typing, logging
+from typing import Optional
+import logging
+#Timing functions
+import time
+
+logger = logging.getLogger('fake_ebird_server')
+
+FIXTURES_DIRECTORY: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class EBirdFixtures:
+    '''
+    Responses replayed by FakeEBirdServer: the full taxonomy, the taxonomy versions list,
+    and the forms of each species, stored as JSON in the fixtures directory.
+    '''
+    TAXONOMY_FILE: str = 'taxonomy.json'
+    VERSIONS_FILE: str = 'taxonomy_versions.json'
+    FORMS_FILE: str = 'forms.json'
+
+    def __init__(self, taxonomy: list[dict], versions: list[dict], forms: dict[str, list[str]]) -> None:
+        self.taxonomy: list[dict] = taxonomy
+        self.versions: list[dict] = versions
+        self.forms: dict[str, list[str]] = forms
+        self.by_code: dict[str, dict] = {entry['speciesCode']: entry for entry in taxonomy}
+        self.taxonomy_body: bytes = json.dumps(taxonomy).encode()
+        self.taxonomy_etag: str = f'"{hashlib.sha256(self.taxonomy_body).hexdigest()[:32]}"'
+
+    def __repr__(self):
+        return f'(class) eBird fixtures, {len(self.taxonomy)} taxa'
+
+    @classmethod
+    def load(cls, directory: str = FIXTURES_DIRECTORY) -> 'EBirdFixtures':
+        data: list = []
+        for file_name in (cls.TAXONOMY_FILE, cls.VERSIONS_FILE, cls.FORMS_FILE):
+            with open(os.path.join(directory, file_name)) as fixture_file:
+                data.append(json.load(fixture_file))
+        return cls(*data)
+
+    @classmethod
+    def synthetic(cls, species_count: int, forms_per_species: int = 1, version: float = 2024.0) -> 'EBirdFixtures':
+        '''
+        A generated taxonomy of the real size and shape, for throughput benchmarks.
+        >>> EBirdFixtures.synthetic(2, forms_per_species=1).forms
+        {'syn00000': ['syn00000', 'syn00000a'], 'syn00001': ['syn00001', 'syn00001a']}
+        '''
+        taxonomy: list[dict] = []
+        forms: dict[str, list[str]] = {}
+        for number in range(species_count):
+            code: str = f'syn{number:05d}'
+            family: int = number % 250
+            species: dict = {'sciName': f'Genus{number % 2300} epithet{number}',
+                             'comName': f'Synthetic Bird {number}',
+                             'speciesCode': code,
+                             'category': 'species',
+                             'taxonOrder': float(number),
+                             'bandingCodes': [], 'comNameCodes': [], 'sciNameCodes': [],
+                             'order': f'Order{family % 40}formes',
+                             'familyCode': f'fam{family}',
+                             'familyComName': f'Family {family}',
+                             'familySciName': f'Family{family}idae'}
+            taxonomy.append(species)
+            forms[code] = [code]
+            for form in range(forms_per_species):
+                form_code: str = f'{code}{chr(ord("a") + form)}'
+                taxonomy.append({**species,
+                                 'sciName': f'{species["sciName"]} form{form}',
+                                 'comName': f'{species["comName"]} ({chr(ord("A") + form)})',
+                                 'speciesCode': form_code,
+                                 'category': 'issf',
+                                 'reportAs': code})
+                forms[code].append(form_code)
+        return cls(taxonomy, [{'authorityVer': version, 'latest': True}], forms)
+
+    def save(self, directory: str = FIXTURES_DIRECTORY) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for file_name, data in ((self.TAXONOMY_FILE, self.taxonomy),
+                                (self.VERSIONS_FILE, self.versions),
+                                (self.FORMS_FILE, self.forms)):
+            with open(os.path.join(directory, file_name), 'w') as fixture_file:
+                json.dump(data, fixture_file, indent=1)
+        return None
+
+def record_fixtures(species_codes: list[str], directory: str = FIXTURES_DIRECTORY) -> EBirdFixtures:
+    '''
+    Record live eBird responses for the given species (and their forms) into the fixtures
+    directory. Needs a working EBIRD_API_KEY.
+    '''
+    from eBird_methods import EBirdWeb
+
+    web = EBirdWeb()
+    try:
+        versions: Optional[list[dict]] = web.status_test(web.get_taxonomy_versions(), lambda data: data, web.throw_connection_error)
+        forms: dict[str, list[str]] = {}
+        for species_code in species_codes:
+            species_forms: Optional[list[str]] = web.get_subspecies_codes(species_code)
+            if species_forms is not None:
+                forms[species_code] = species_forms
+        codes: list[str] = [code for species_forms in forms.values() for code in species_forms]
+        taxonomy: list[dict] = []
+        for batch in web.batch_species_codes(codes):
+            response = web._get_unfiltered_subspecies_data(batch)
+            taxonomy.extend(web.status_test(response, lambda data: data, web.throw_connection_error) or [])
+    finally:
+        web.close()
+    fixtures = EBirdFixtures(taxonomy, versions or [], forms)
+    fixtures.save(directory)
+    return fixtures
+
+class FakeEBirdServer:
+    '''
+    Local stand-in for the eBird API, serving EBirdFixtures at the same paths under /v2.
+    Every request waits `latency` seconds, then fails with a 5xx with probability `error_rate`
+    or a 429 with probability `throttle_rate`. Use as a context manager, or start()/stop().
+
+    >>> with FakeEBirdServer(EBirdFixtures.synthetic(3)) as server:
+    ...     web = EBirdWeb(base_url=server.base_url)
+    ...     web.get_taxonomy_version(), web.get_subspecies_codes('syn00001')
+    (2024.0, ['syn00001', 'syn00001a'])
+    '''
+    def __init__(self,
+                 fixtures: Optional[EBirdFixtures] = None,
+                 latency: float = 0,
+                 error_rate: float = 0,
+                 throttle_rate: float = 0,
+                 retry_after: int = 0,
+                 seed: Optional[int] = None,
+                 host: str = '127.0.0.1',
+                 port: int = 0) -> None:
+        self.fixtures: EBirdFixtures = fixtures if fixtures is not None else EBirdFixtures.load()
+        self.latency: float = latency
+        self.error_rate: float = error_rate
+        self.throttle_rate: float = throttle_rate
+        self.retry_after: int = retry_after
+        self.random = random.Random(seed)
+        self.requests: dict[str, int] = {'total': 0, 'errors': 0, 'throttled': 0}
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def __repr__(self):
+        return f'(class) Fake eBird server at {self.base_url}'
+
+    def __enter__(self) -> 'FakeEBirdServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v2'
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-ebird-server', daemon=True)
+        self._thread.start()
+        return None
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        return None
+
+    def _injected_fault(self) -> Optional[int]:
+        with self._lock:
+            self.requests['total'] += 1
+            roll: float = self.random.random()
+            if roll < self.error_rate:
+                self.requests['errors'] += 1
+                return self.random.choice((500, 502, 503))
+            if roll < self.error_rate + self.throttle_rate:
+                self.requests['throttled'] += 1
+                return 429
+        return None
+
+    def _route(self, path: str, query: dict[str, list[str]],
+               if_none_match: Optional[str]) -> tuple[int, bytes, dict[str, str]]:
+        fixtures: EBirdFixtures = self.fixtures
+        if path == '/v2/ref/taxonomy/versions':
+            return 200, json.dumps(fixtures.versions).encode(), {}
+        if path.startswith('/v2/ref/taxon/forms/'):
+            species_code: str = path.rsplit('/', 1)[1]
+            if species_code not in fixtures.forms:
+                return 400, b'[]', {}
+            return 200, json.dumps(fixtures.forms[species_code]).encode(), {}
+        if path == '/v2/ref/taxonomy/ebird':
+            if 'species' in query:
+                codes: list[str] = query['species'][0].split(',')
+                return 200, json.dumps([fixtures.by_code[code] for code in codes if code in fixtures.by_code]).encode(), {}
+            if if_none_match == fixtures.taxonomy_etag:
+                return 304, b'', {'ETag': fixtures.taxonomy_etag}
+            return 200, fixtures.taxonomy_body, {'ETag': fixtures.taxonomy_etag}
+        return 404, b'', {}
+
+    def _handler_class(self) -> type[http.server.BaseHTTPRequestHandler]:
+        server: FakeEBirdServer = self
+
+        class FakeEBirdHandler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self) -> None:
+                if server.latency:
+                    time.sleep(server.latency)
+                fault: Optional[int] = server._injected_fault()
+                headers: dict[str, str] = {}
+                if fault is None:
+                    url = urllib.parse.urlparse(self.path)
+                    status, body, headers = server._route(url.path, urllib.parse.parse_qs(url.query),
+                                                          self.headers.get('If-None-Match'))
+                else:
+                    status, body = fault, b''
+                    if fault == 429:
+                        headers['Retry-After'] = str(server.retry_after)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                logger.debug(format % args)
+
+        return FakeEBirdHandler
+
+def run_benchmark(fixtures: EBirdFixtures, max_workers: int = 4, requests_per_second: float = 50, 
+                  **server_options) -> dict[str, object]:
+    '''
+    Time a full taxonomy update and subspecies prefetch against a FakeEBirdServer. Runs in a
+    temporary directory, so the real pin database and response cache are left alone.
+    '''
+    from eBird_methods import EBirdWeb, EBirdBridge, database_pool
+
+    results: dict[str, object] = {}
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory, FakeEBirdServer(fixtures, **server_options) as server:
+        os.chdir(scratch_directory)
+        try:
+            bridge = EBirdBridge(web=EBirdWeb(base_url=server.base_url, max_connections=max_workers))
+            bridge.LocalDBInterface.initialise_database()
+            for run in ('update (cold)', 'update (unchanged)'):
+                start: float = time.perf_counter()
+                results[run] = bridge.update_database(force=run == 'update (cold)')
+                results[f'{run} seconds'] = time.perf_counter() - start
+            start = time.perf_counter()
+            results['prefetch'] = bridge.prefetch_subspecies(max_workers=max_workers, 
+                                                             requests_per_second=requests_per_second)
+            results['prefetch seconds'] = time.perf_counter() - start
+            bridge.close_connection()
+        finally:
+            #Let go of the scratch database before its directory is removed
+            database_pool.close()
+            os.chdir(working_directory)
+        results['server requests'] = dict(server.requests)
+    return results
+
+def main(auto_test: bool = False):
+    if auto_test:
+        import doctest
+        from eBird_methods import EBirdWeb
+        doctest.testmod(extraglobs={'EBirdWeb': EBirdWeb})
+        return None
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve recorded or synthetic eBird responses locally.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--synthetic', type=int, default=None, help='serve a generated taxonomy of this many species')
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--benchmark', action='store_true', help='time an update and prefetch against the server, then exit')
+    parser.add_argument('--workers', type=int, default=4)
+    arguments = parser.parse_args()
+    fixtures: EBirdFixtures = EBirdFixtures.load() if arguments.synthetic is None else EBirdFixtures.synthetic(arguments.synthetic)
+    if arguments.benchmark:
+        results: dict[str, object] = run_benchmark(fixtures,
+                                                   max_workers=arguments.workers,
+                                                   latency=arguments.latency,
+                                                   error_rate=arguments.error_rate,
+                                                   throttle_rate=arguments.throttle_rate,
+                                                   seed=arguments.seed)
+        for name, result in results.items():
+            print(f'{name}: {result}')
+        return None
+    server = FakeEBirdServer(fixtures,
+                             latency=arguments.latency,
+                             error_rate=arguments.error_rate,
+                             throttle_rate=arguments.throttle_rate,
+                             seed=arguments.seed,
+                             port=arguments.port)
+    print(f'Serving {fixtures} at {server.base_url}; set EBIRD_API_URL to this to use it.')
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+    return None
+
+if __name__ == '__main__':
+    logging.basicConfig(filename='fake_ebird_server.log', level=logging.INFO)
+    logger.info(f'{"begin log":{"-"}^40}')
+    try:
+        main()
+    except Exception as err:
+        logger.exception(f'Got exception on main handler: {err}')
+        raise
+    finally:
+        logger.info(f'{"end log":{"-"}^40}')
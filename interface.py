@@ -7,7 +7,7 @@ from typing import Optional, Literal
 from PIL import Image
 import customtkinter as ctk #type: ignore[import-untyped]
 
-from eBird_methods import UserLocalDBBridge, EBirdBridge
+from eBird_methods import UserLocalDBBridge, EBirdBridge, TaxonomyUpdateScheduler, SpeciesSearchWorker, database_pool, prepare_database
 from eBird_methods import DataDict, DictWithScore, BirdDict, SubspeciesDict, SupergroupDict, SourceDict, SubgroupDict, PinDict
 
 logger = logging.getLogger('interface')
@@ -54,6 +54,16 @@ class App(ctk.CTk):
         self.WINDOW_SETTINGS: dict[str, object] = {'row': 1, 'column': 0, 'columnspan': 2, 
                                                    'padx': 20, 'pady': 20, 
                                                    'sticky': ctk.NSEW}
+        # Seconds between background taxonomy checks; None checks once at startup only
+        TAXONOMY_CHECK_INTERVAL: float | None = None
+
+        # Schema upgrade before any screen reads the database, rather than left to the background check
+        prepare_database()
+
+        # Background taxonomy check, so a stale local database is refreshed without blocking the window
+        self.taxonomy_scheduler = TaxonomyUpdateScheduler(interval=TAXONOMY_CHECK_INTERVAL)
+        self.taxonomy_scheduler.start()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
         # Home button
         home_icon = Image.open("./assets/Birdhouse icon blue.png")
@@ -110,6 +120,11 @@ class App(ctk.CTk):
         self.screens[new_window_name], self.current_window = (new_window,)*2
         self.current_window.grid(**self.WINDOW_SETTINGS)
 
+    def _on_close(self) -> None:
+        self.taxonomy_scheduler.stop(timeout=0)
+        self.destroy()
+        database_pool.close()
+
     def refresh_window(self) -> None:
         self.current_window.destroy()
         self.screens[self.current_window_name], self.current_window = (self.screen_types[self.current_window_name](self),)*2
@@ -132,8 +147,10 @@ class ScreenWelcome(ctk.CTkFrame):
 
     def _update_database(self):
         bridge = EBirdBridge()
-        bridge.update_database()
+        report = bridge.update_database()
         bridge.close_connection()
+        logger.info(f'Bird database update: cache {report["cache"]}, updated: {report["updated"]}, '
+                    f'taxonomy version: {report["taxonomy_version"]}, changes: {report["changes"]}')
 
     def __init__(self, master: App, **kwargs) -> None:
         super().__init__(master, **kwargs)
@@ -193,6 +210,11 @@ class ScreenEnterNewPin(ctk.CTkFrame):
                                                 font=ctk.CTkFont(family="Arial", size=10))
         self.species_error_label.grid(**self.SPECIES_FRAME_LAYOUT['ERROR_LABEL_LOCATION'])
         self.species_error_label.grid_forget()
+        # Live suggestions, refreshed once typing pauses
+        self.species_suggestions_label = ctk.CTkLabel(self.species_frame_initial, text='', justify='left',
+                                                      font=ctk.CTkFont(family="Arial", size=10))
+        self.species_suggestions_label.grid(**self.SPECIES_FRAME_LAYOUT['SUGGESTIONS_LOCATION'])
+        self.species_name_input.trace_add('write', self._species_name_changed)
         return None
 
     def _layout_species_frame_dropdown(self) -> None: 
@@ -300,6 +322,10 @@ class ScreenEnterNewPin(ctk.CTkFrame):
         self.BUTTON_WIDTH: int = 20
         self.LONG_BOX_WIDTH: int = 300
         self.REJECT_OPTIONS: str = 'None of the above'
+        self.SEARCH_DEBOUNCE_MS: int = 300
+        self.SEARCH_POLL_MS: int = 30
+        self.SUGGESTION_COUNT: int = 5
+        self.SPECIES_OPTION_COUNT: int = 10
 
         self.TITLE_LOCATION: dict[str, int] = {'row': 0, 'column': 0, 'columnspan': 4, 
                                                'padx': 10, 'pady': 10}
@@ -318,6 +344,8 @@ class ScreenEnterNewPin(ctk.CTkFrame):
                                                                                   'columnspan': 2}, 
                                                                 'BUTTON_LOCATION':{'row': 0, 'column': 3},
                                                                 'ERROR_LABEL_LOCATION':{'row': 1, 'column': 1,
+                                                                                        'columnspan': 2},
+                                                                'SUGGESTIONS_LOCATION':{'row': 2, 'column': 1,
                                                                                         'columnspan': 2}}
         self.SUBSPECIES_FRAME_LAYOUT: dict[str, dict[str,int]] = self.SPECIES_FRAME_LAYOUT
         self.SOURCE_FRAME_LAYOUT: dict[str, dict[str,int]] = {'TYPE_DROPDOWN_LOCATION': {'row': 0, 'column': 1}, 
@@ -388,6 +416,9 @@ class ScreenEnterNewPin(ctk.CTkFrame):
 
         self.picked_species_data: BirdDict
         self.picked_subspecies_data: SubspeciesDict
+        self._species_search_worker: Optional[SpeciesSearchWorker] = None
+        self._pending_species_search: Optional[str] = None
+        self._pending_species_poll: Optional[str] = None
 
         self._layout_screen()
 
@@ -405,19 +436,24 @@ class ScreenEnterNewPin(ctk.CTkFrame):
 
     def _find_source_type(self, source_name: str) -> str:
         bridge = UserLocalDBBridge()
-        sources: list[SourceDict] = bridge.LocalDBInterface.source_table.get_data()
-        source_type: str
-        for source in sources:
-            if source['name'] is source_name:
-                source_type = source['type']
-        return source_type
+        sources: list[SourceDict] = bridge.LocalDBInterface.source_table.query(where={'name': source_name}, columns=['type'], limit=1)
+        bridge.close_connection()
+        return sources[0]['type']
+
+    def _find_common_name(self, eBird_code: str, subspecies: bool = False) -> str:
+        bridge = UserLocalDBBridge()
+        table = bridge.LocalDBInterface.bird_subspecies_table if subspecies else bridge.LocalDBInterface.bird_table
+        birds: list[BirdDict] = table.query(where={'eBird_code': eBird_code}, columns=['common_name'], limit=1)
+        bridge.close_connection()
+        # A code no longer in the taxonomy is shown as it is
+        return birds[0]['common_name'] if birds else eBird_code
 
     def _set_initial_values(self, pin_details: PinDict) -> None:
         source_type: str = self._find_source_type(pin_details['source'])
 
-        self.species_name_input.set(pin_details['species'])
+        self.species_name_input.set(self._find_common_name(pin_details['species']))
         if pin_details['subspecies']:
-            self.picked_subspecies.set(pin_details['subspecies'])
+            self.picked_subspecies.set(self._find_common_name(pin_details['subspecies'], subspecies=True))
         self.picked_source_type.set(source_type)
         self.picked_source.set(pin_details['source'])
         if pin_details['subgroup']:
@@ -426,10 +462,50 @@ class ScreenEnterNewPin(ctk.CTkFrame):
 
     def _search_in_database(self, test_name: str) -> list[DictWithScore[BirdDict]]:
         bridge = UserLocalDBBridge()
-        possible_species_with_scores: list[DictWithScore[BirdDict]] = bridge.fuzzy_search_species_ebird(test_name)
+        possible_species_with_scores: list[DictWithScore[BirdDict]] = bridge.top_species_ebird(test_name, limit=self.SPECIES_OPTION_COUNT, 
+                                                                                                            phonetic=True)
         bridge.close_connection()
         return possible_species_with_scores
 
+    def _species_name_changed(self, *args) -> None:
+        # Restart the countdown on every keystroke, so only a pause in typing runs a search
+        if self._pending_species_search is not None:
+            self.after_cancel(self._pending_species_search)
+        self._pending_species_search = self.after(self.SEARCH_DEBOUNCE_MS, self._search_species_suggestions)
+        return None
+
+    def _search_species_suggestions(self) -> None:
+        # Scored on the worker's thread, so typing never waits on a search
+        self._pending_species_search = None
+        if self._species_search_worker is None:
+            self._species_search_worker = SpeciesSearchWorker(limit=self.SUGGESTION_COUNT)
+            self._species_search_worker.start()
+        self._species_search_worker.submit(self.species_name_input.get())
+        if self._pending_species_poll is None:
+            self._pending_species_poll = self.after(self.SEARCH_POLL_MS, self._show_species_suggestions)
+        return None
+
+    def _show_species_suggestions(self) -> None:
+        self._pending_species_poll = None
+        result: Optional[tuple[str, list[DictWithScore[BirdDict]]]] = self._species_search_worker.result()
+        if result is not None:
+            query, suggestions = result
+            self.species_suggestions_label.configure(text='\n'.join(f"{species_data['common_name']} ({score}% match)" 
+                                                                    for species_data, score in suggestions))
+        # Keep polling until the search for what is in the box now has been shown
+        if result is None or query != self.species_name_input.get():
+            self._pending_species_poll = self.after(self.SEARCH_POLL_MS, self._show_species_suggestions)
+        return None
+
+    def destroy(self) -> None:
+        if self._pending_species_search is not None:
+            self.after_cancel(self._pending_species_search)
+        if self._pending_species_poll is not None:
+            self.after_cancel(self._pending_species_poll)
+        if self._species_search_worker is not None:
+            self._species_search_worker.stop(timeout=0)
+        super().destroy()
+
     def _add_species_to_menu(self, species_with_scores: list[DictWithScore[BirdDict]]) -> None:
         dropdown_options: list[str] = [self.REJECT_OPTIONS]
         for species_data, score in species_with_scores:
@@ -467,10 +543,6 @@ class ScreenEnterNewPin(ctk.CTkFrame):
             self.species_error_label.configure(text='No species found. Double check the name!')
             self.species_error_label.grid(**self.SPECIES_FRAME_LAYOUT['ERROR_LABEL_LOCATION'])
             return None
-        if len(self.possible_species_with_scores) > 10:
-            self.species_error_label.configure(text='Too many possible matches. Try being more specific!')
-            self.species_error_label.grid(**self.SPECIES_FRAME_LAYOUT['ERROR_LABEL_LOCATION'])
-            return None
         
         self.species_frame_initial.grid_forget()
 
@@ -501,7 +573,10 @@ class ScreenEnterNewPin(ctk.CTkFrame):
         possible_subspecies: Optional[list[SubspeciesDict]] = bridge.retrieve_subspecies(species_code)
         bridge.close_connection()        
         if possible_subspecies is None:
-            raise ConnectionError('Something went wrong while connecting to eBird')
+            # Not stored locally and eBird is unreachable, so carry on without subspecies
+            logger.warning(f'Could not retrieve subspecies for {species_code}')
+            self._subspecies_toggle.grid_forget()
+            return None
         if len(possible_subspecies) == 1:
             self._subspecies_toggle.grid_forget()
             return None
@@ -586,34 +661,31 @@ class ScreenEnterNewPin(ctk.CTkFrame):
         return None
 
     def _validate_button_pressed(self) -> None:
-        picked_species: str = self.picked_species_data['common_name']
+        picked_species: BirdDict = self.picked_species_data
         is_subspecies: bool = self._subspecies_toggle.get()
-        picked_subspecies: str | None = None
+        picked_subspecies: SubspeciesDict | None = None
         if is_subspecies:
-            picked_subspecies = self._subspecies_dropdown.get()
+            picked_option: str = self._subspecies_dropdown.get()
+            for data in self.possible_subspecies:
+                if data['common_name'] == picked_option:
+                    picked_subspecies = data
         picked_source: str = self.source_dropdown.get()
         is_subgroup: bool = self._subgroup_toggle.get()
         picked_subgroup: str | None = None
         if is_subgroup:
             picked_subgroup = self._subgroup_dropdown.get()
-        pin: PinDict
         # Splitting into cases so can return an appropriate error message later.
         if not picked_species:
             return None
-        if is_subspecies and not picked_subspecies:
+        if is_subspecies and picked_subspecies is None:
             return None
         if not picked_source:
             return None
         if is_subgroup and not picked_subgroup:
             return None
-        pin = {'id': None, 
-               'species': picked_species, 
-               'subspecies': picked_subspecies, 
-               'source': picked_source,
-               'subgroup': picked_subgroup}
-        
+        # Stored by eBird code, which the collection statistics and pin transfers join on
         bridge = UserLocalDBBridge()
-        bridge.LocalDBInterface.pin_table.add_data([pin])
+        bridge.add_pin(picked_species, picked_subspecies, picked_source, picked_subgroup)
         bridge.close_connection()
 
         self._validate_button.configure(state=ctk.DISABLED, text='Validated')
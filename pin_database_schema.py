@@ -1,7 +1,9 @@
 import peewee as pw
+from playhouse.sqlite_ext import FTS5Model, SearchField
 
 from abc import ABC, abstractmethod
-from typing import TypeVar, TypedDict, Generic
+from typing import Callable, TypeVar, TypedDict, Generic, Iterable, Iterator, Sequence, Any
+import sys
 
 DATABASE: str = 'pin_database.db'
 
@@ -13,12 +15,16 @@ class BirdDict(TypedDict):
     family: str
     genus: str
     species: str
+    search_name: str
+    phonetic_key: str
 
 class SubspeciesDict(TypedDict):
     eBird_code: str
     common_name: str
     subspecies: str
     species: str
+    search_name: str
+    phonetic_key: str
 
 class SupergroupDict(TypedDict):
     name: str
@@ -48,7 +54,111 @@ class PinDict(TypedDict):
     source: str
     subgroup: str | None
 
-DataDict = TypeVar('DataDict', PinDict, BirdDict, SourceDict, SubspeciesDict, SubgroupDict, SupergroupDict)
+class MetadataDict(TypedDict):
+    key: str
+    value: str
+
+class SubspeciesFetchDict(TypedDict):
+    species: str
+    fetched_at: float
+
+class BigramDict(TypedDict):
+    bigram: str
+    eBird_code: str
+    #Times the bigram appears in the bird's search name
+    occurrences: int
+
+class SpeciesSearchDict(TypedDict):
+    eBird_code: str
+    common_name: str
+    scientific_name: str
+    family: str
+
+class CollectionStatisticDict(TypedDict):
+    dimension: str
+    name: str
+    count: int
+
+class Record:
+    '''
+    Read-only row with dict-style access, far smaller than a dict, for tables held whole in
+    memory. Columns named in INTERNED repeat across rows, so each row shares one copy.
+    >>> bird = BirdRecord.from_values(('rocpig', 'Rock Pigeon', 'Pigeons and Doves', 'Columbiformes', 'Columbidae', 'Columba', 'livia', 'rock pigeon', 'R200 P250'))
+    >>> bird['common_name'], bird.get('subspecies'), bird.get('keys'), bird == dict(bird)
+    ('Rock Pigeon', None, None, True)
+    '''
+    __slots__: tuple[str, ...] = ()
+    INTERNED: frozenset[str] = frozenset()
+
+    def __init_subclass__(cls) -> None:
+        #Worked out once per record type, since from_values runs for every row of a table
+        cls._slot_setters: list[Callable[[Any, Any], None]] = [getattr(cls, column).__set__ for column in cls.__slots__]
+        cls._interned_positions: list[int] = [position for position, column in enumerate(cls.__slots__) if column in cls.INTERNED]
+        #Only columns are items, not methods or class attributes
+        cls._columns: frozenset[str] = frozenset(cls.__slots__)
+
+    @classmethod
+    def from_values(cls, values: Sequence[Any]) -> 'Record':
+        '''Build from column values in __slots__ order.'''
+        values = list(values)
+        for position in cls._interned_positions:
+            if isinstance(values[position], str):
+                values[position] = sys.intern(values[position])
+        record: Record = object.__new__(cls)
+        for set_slot, value in zip(cls._slot_setters, values):
+            set_slot(record, value)
+        return record
+
+    @classmethod
+    def from_dict(cls, row: dict[str, Any]) -> 'Record':
+        return cls.from_values([row[column] for column in cls.__slots__])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    def __reduce__(self) -> tuple:
+        #Pickle and copy by value, since the default route sets each slot
+        return (type(self).from_values, (tuple(self.values()),))
+
+    def __getitem__(self, column: str) -> Any:
+        if column not in self._columns:
+            raise KeyError(column)
+        return getattr(self, column)
+
+    def get(self, column: str, default: Any = None) -> Any:
+        return getattr(self, column) if column in self._columns else default
+
+    def keys(self) -> tuple[str, ...]:
+        return self.__slots__
+
+    def values(self) -> list[Any]:
+        return [getattr(self, column) for column in self.__slots__]
+
+    def items(self) -> list[tuple[str, Any]]:
+        return list(zip(self.__slots__, self.values()))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.values()))
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self.items())})'
+
+class BirdRecord(Record):
+    __slots__ = tuple(BirdDict.__annotations__)
+    INTERNED = frozenset({'family_common_name', 'bird_order', 'family', 'genus'})
+
+class SubspeciesRecord(Record):
+    __slots__ = tuple(SubspeciesDict.__annotations__)
+    INTERNED = frozenset({'species'})
+
+RecordType = TypeVar('RecordType', bound=Record)
+
+DataDict = TypeVar('DataDict', PinDict, BirdDict, SourceDict, SubspeciesDict, SubgroupDict, SupergroupDict, MetadataDict, SubspeciesFetchDict, BigramDict, SpeciesSearchDict, CollectionStatisticDict)
 
 class Table(ABC, Generic[DataDict]):
 
@@ -57,6 +167,7 @@ class Table(ABC, Generic[DataDict]):
 
         @abstractmethod
         def create(self) -> None:
+            '''Create the table if needed, adding any columns an older database is missing.'''
             pass
 
         @abstractmethod
@@ -64,13 +175,68 @@ class Table(ABC, Generic[DataDict]):
             pass
 
         @abstractmethod
-        def add_data(self, data: list[DataDict]) -> None:
+        def clear(self) -> None:
+            '''Delete every row, as part of any open transaction, unlike drop.'''
+            pass
+
+        @abstractmethod
+        def add_data(self, data: Iterable[DataDict]) -> None:
+            pass
+
+        @abstractmethod
+        def replace_data(self, data: Iterable[DataDict]) -> None:
+            pass
+
+        @abstractmethod
+        def update_data(self, changes: dict[Any, dict[str, Any]]) -> None:
+            '''Set only the given columns, for each row keyed by primary key.'''
+            pass
+
+        @abstractmethod
+        def delete_data(self, keys: Iterable[Any], column: str | None = None) -> None:
+            '''Delete rows whose `column` (the primary key by default) is one of `keys`.'''
             pass
 
         @abstractmethod
         def get_data(self) -> list[DataDict]:
             pass
 
+        @abstractmethod
+        def iter_data(self) -> Iterator[DataDict]:
+            '''Every row, read in batches, for scans that need not hold the whole table.'''
+            pass
+
+        @abstractmethod
+        def get_records(self, record_type: type[RecordType]) -> list[RecordType]:
+            '''Every row as a compact record_type, made straight from the column values.'''
+            pass
+
+        @abstractmethod
+        def get_keys(self) -> list[Any]:
+            pass
+
+        @abstractmethod
+        def get_data_by_keys(self, keys: Sequence[Any], column: str | None = None) -> list[DataDict]:
+            '''Rows whose `column` (the primary key by default) is one of `keys`.'''
+            pass
+
+        @abstractmethod
+        def query(self, 
+                  where: dict[str, Any] | None = None, 
+                  columns: Sequence[str] | None = None, 
+                  order_by: Sequence[str] | None = None, 
+                  limit: int | None = None) -> list[DataDict]:
+            '''
+            Rows whose `where` columns equal their values (or are one of them, for a list, tuple or
+            set, or are null, for None), with only `columns`, sorted by `order_by`, where '-column'
+            sorts descending, and at most `limit` of them. Unknown columns raise ValueError.
+            '''
+            pass
+
+        @abstractmethod
+        def is_empty(self) -> bool:
+            pass
+
 
 db = pw.SqliteDatabase(DATABASE)
 
@@ -82,6 +248,8 @@ class Bird(pw.Model):
     family = pw.CharField()
     genus = pw.CharField()
     species = pw.CharField()
+    search_name = pw.CharField(default='', index=True)
+    phonetic_key = pw.CharField(default='', index=True)
 
     class Meta:
         database = db
@@ -91,6 +259,8 @@ class BirdSubspecies(pw.Model):
     common_name = pw.CharField()
     subspecies = pw.CharField()
     species = pw.ForeignKeyField(Bird, backref='subspecies')
+    search_name = pw.CharField(default='', index=True)
+    phonetic_key = pw.CharField(default='', index=True)
 
     class Meta:
         database = db
@@ -106,7 +276,7 @@ class Supergroup(pw.Model):
 
 class Source(pw.Model):
     name = pw.CharField(primary_key=True)
-    type = pw.CharField()
+    type = pw.CharField(index=True)
     short_name = pw.CharField(null=True)
     description = pw.CharField(null=True)
     parent = pw.ForeignKeyField(Supergroup, backref='supergroups', null=True)
@@ -132,4 +302,48 @@ class Pin(pw.Model):
     subgroup = pw.ForeignKeyField(Subgroup, backref='pins', null=True)
 
     class Meta:
-        database = db
\ No newline at end of file
+        database = db
+
+class Metadata(pw.Model):
+    key = pw.CharField(primary_key=True)
+    value = pw.CharField()
+
+    class Meta:
+        database = db
+
+class SubspeciesFetch(pw.Model):
+    species = pw.CharField(primary_key=True)
+    fetched_at = pw.FloatField()
+
+    class Meta:
+        database = db
+
+class BirdBigram(pw.Model):
+    bigram = pw.CharField()
+    eBird_code = pw.CharField()
+    occurrences = pw.IntegerField(default=1)
+
+    class Meta:
+        database = db
+        primary_key = pw.CompositeKey('bigram', 'eBird_code')
+        without_rowid = True
+
+class CollectionStatistic(pw.Model):
+    dimension = pw.CharField()
+    name = pw.CharField()
+    count = pw.IntegerField()
+
+    class Meta:
+        database = db
+        primary_key = pw.CompositeKey('dimension', 'name')
+        without_rowid = True
+
+class BirdSearch(FTS5Model):
+    eBird_code = SearchField()
+    common_name = SearchField()
+    scientific_name = SearchField()
+    family = SearchField()
+
+    class Meta:
+        database = db
+        options = {'tokenize': 'trigram'}
@@ -0,0 +1,232 @@
+#File formats
+import csv
+import json
+import os
+#Column lists worked out once per table
+from functools import cache
+from contextlib import AbstractContextManager, nullcontext
+#Typing, logging
+from typing import Literal, Iterable, Iterator, Sequence, TypeAlias, TypedDict, Any, get_args, get_type_hints
+import logging
+
+from eBird_methods import PinDatabaseInterface, pinDatabaseFactory, database_pool, chunked
+from pin_database_schema import Table, PinDict, SourceDict, SubgroupDict, SupergroupDict
+
+logger = logging.getLogger('pin_transfer')
+
+TransferTable: TypeAlias = Literal['Pin', 'Source', 'Subgroup', 'Supergroup']
+TransferFormat: TypeAlias = Literal['csv', 'jsonl']
+
+class ImportReport(TypedDict):
+    #Rows that passed every check and were added
+    imported: int
+    #Rows whose key is already in the table, or earlier in the file, left as they were
+    existing: int
+    rejected: int
+    #The first few rejections, as 'row number: reason'
+    errors: list[str]
+
+TABLE_ROWS: dict[TransferTable, type] = {'Pin': PinDict, 'Source': SourceDict, 'Subgroup': SubgroupDict, 'Supergroup': SupergroupDict}
+#Primary key column of each table; a pin without an id is always new
+TABLE_KEYS: dict[TransferTable, str] = {'Pin': 'id', 'Source': 'name', 'Subgroup': 'name', 'Supergroup': 'name'}
+SOURCE_TYPES: tuple[str, ...] = ('Charity', 'Artist', 'Other')
+
+def file_format(path: str) -> TransferFormat:
+    '''
+    >>> file_format('pins.CSV'), file_format('exports/sources.jsonl')
+    ('csv', 'jsonl')
+    '''
+    extension: str = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension not in get_args(TransferFormat):
+        raise ValueError(f'Cannot tell the format of {path!r}; use a .csv or .jsonl file')
+    return extension
+
+@cache
+def columns(table_name: TransferTable) -> tuple[str, ...]:
+    '''
+    >>> columns('Pin')
+    ('id', 'species', 'subspecies', 'source', 'subgroup')
+    '''
+    return tuple(get_type_hints(TABLE_ROWS[table_name]))
+
+@cache
+def nullable_columns(table_name: TransferTable) -> frozenset[str]:
+    '''
+    >>> sorted(nullable_columns('Pin'))
+    ['id', 'subgroup', 'subspecies']
+    '''
+    return frozenset(column for column, hint in get_type_hints(TABLE_ROWS[table_name]).items() if type(None) in get_args(hint))
+
+def read_rows(path: str) -> Iterator[dict[str, Any]]:
+    '''Rows of a CSV file (with a header line) or a JSON Lines file, one at a time.'''
+    with open(path, newline='', encoding='utf-8') as transfer_file:
+        if file_format(path) == 'csv':
+            yield from csv.DictReader(transfer_file)
+        else:
+            for line in transfer_file:
+                if line.strip():
+                    yield json.loads(line)
+
+def write_rows(path: str, header: Sequence[str], rows: Iterable[dict[str, Any]]) -> int:
+    '''Write rows as they come, returning how many were written.'''
+    written: int = 0
+    with open(path, 'w', newline='', encoding='utf-8') as transfer_file:
+        if file_format(path) == 'csv':
+            writer = csv.DictWriter(transfer_file, fieldnames=header, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                written += 1
+        else:
+            for row in rows:
+                transfer_file.write(json.dumps({column: row[column] for column in header}) + '\n')
+                written += 1
+    return written
+
+class PinTransfer:
+    '''
+    Streams pins, sources, subgroups and supergroups between the database and CSV or JSON Lines
+    files. Imports check every foreign key, and every row's own key, against sets of the keys
+    that exist, read once up front, and write in a single bulk_write, so a file goes in whole or
+    not at all; rows already in the table are skipped and counted, and rows that fail a check are
+    skipped and reported. Import parents before children: supergroups, sources, subgroups, then pins.
+    '''
+    #Rows handed to add_data at a time while importing
+    CHUNK_SIZE: int = 5000
+    #Rejections listed in an ImportReport; the rest are only counted
+    MAX_ERRORS_REPORTED: int = 20
+
+    def __init__(self) -> None:
+        self.LocalDBInterface: PinDatabaseInterface = pinDatabaseFactory()
+
+    def __repr__(self):
+        return '(class) Pin transfer'
+
+    def _table(self, table_name: TransferTable) -> Table:
+        database: PinDatabaseInterface = self.LocalDBInterface
+        return {'Pin': database.pin_table, 'Source': database.source_table,
+                'Subgroup': database.subgroup_table, 'Supergroup': database.supergroup_table}[table_name]
+
+    def export_rows(self, table_name: TransferTable, path: str) -> int:
+        '''Write a whole table to path, in the format its extension names, returning the row count.'''
+        return write_rows(path, columns(table_name), self._table(table_name).iter_data())
+
+    def _lookups(self, table_name: TransferTable) -> dict[str, set[str] | dict[str, str]]:
+        database: PinDatabaseInterface = self.LocalDBInterface
+        if table_name == 'Source':
+            return {'parent': set(database.supergroup_table.get_keys())}
+        if table_name == 'Subgroup':
+            return {'parent': set(database.source_table.get_keys())}
+        if table_name == 'Pin':
+            return {'species': set(database.bird_table.get_keys()),
+                    'subspecies': set(database.bird_subspecies_table.get_keys()),
+                    'source': set(database.source_table.get_keys()),
+                    #Subgroup to its source, so a pin's subgroup can be checked against its source
+                    'subgroup': {row['name']: row['parent'] for row in database.subgroup_table.query(columns=['name', 'parent'])}}
+        return {}
+
+    def _clean_row(self, table_name: TransferTable, raw_row: dict[str, Any],
+                   lookups: dict[str, set[str] | dict[str, str]]) -> dict[str, Any]:
+        '''The row in table column order, or ValueError saying why it cannot be imported.'''
+        nullable: frozenset[str] = nullable_columns(table_name)
+        row: dict[str, Any] = {}
+        for column in columns(table_name):
+            value: Any = raw_row.get(column)
+            #CSV has no null, so an empty cell stands for one
+            if value == '' or value is None:
+                if column not in nullable:
+                    raise ValueError(f'{column} is missing')
+                value = None
+            elif column in lookups and value not in lookups[column]:
+                raise ValueError(f'{column} {value!r} does not exist')
+            row[column] = value
+        if table_name == 'Pin':
+            row['id'] = None if row['id'] is None else int(row['id'])
+            if row['subgroup'] is not None and lookups['subgroup'][row['subgroup']] != row['source']:
+                raise ValueError(f"subgroup {row['subgroup']!r} is not part of source {row['source']!r}")
+        if table_name == 'Source' and row['type'] not in SOURCE_TYPES:
+            raise ValueError(f"type {row['type']!r} is not one of {', '.join(SOURCE_TYPES)}")
+        return row
+
+    def _valid_rows(self, table_name: TransferTable, raw_rows: Iterable[dict[str, Any]],
+                    report: ImportReport) -> Iterator[dict[str, Any]]:
+        lookups: dict[str, set[str] | dict[str, str]] = self._lookups(table_name)
+        key_column: str = TABLE_KEYS[table_name]
+        #Filtered here rather than left to the database, so both backends skip and count them alike
+        existing_keys: set[Any] = set(self._table(table_name).get_keys())
+        for row_number, raw_row in enumerate(raw_rows, start=1):
+            try:
+                row: dict[str, Any] = self._clean_row(table_name, raw_row, lookups)
+            except ValueError as err:
+                report['rejected'] += 1
+                if len(report['errors']) < self.MAX_ERRORS_REPORTED:
+                    report['errors'].append(f'{row_number}: {err}')
+                continue
+            key: Any = row[key_column]
+            if key is not None:
+                if key in existing_keys:
+                    report['existing'] += 1
+                    continue
+                existing_keys.add(key)
+            report['imported'] += 1
+            yield row
+
+    def import_rows(self, table_name: TransferTable, path: str) -> ImportReport:
+        '''
+        Add the rows in path to a table. Rows keep the key they are given, and any whose key is
+        already taken are counted as existing and left alone, so importing the same export twice
+        adds nothing the second time; pins without an id get a new one.
+        '''
+        report: ImportReport = {'imported': 0, 'existing': 0, 'rejected': 0, 'errors': []}
+        table: Table = self._table(table_name)
+        #Tables and the statistics triggers are only created here, never on the database's read paths
+        self.LocalDBInterface.upgrade_schema()
+        statistics: AbstractContextManager = nullcontext()
+        if table_name == 'Pin':
+            #Counting the whole collection again afterwards beats the triggers' six upserts per pin
+            statistics = self.LocalDBInterface.collection_statistics_paused()
+        with self.LocalDBInterface.bulk_write(), statistics:
+            for chunk in chunked(self._valid_rows(table_name, read_rows(path), report), self.CHUNK_SIZE):
+                table.add_data(chunk)
+        logger.info(f'Imported {path} into {table_name}: {report["imported"]} rows, '
+                    f'{report["existing"]} already there, {report["rejected"]} rejected')
+        return report
+
+    def close_connection(self) -> None:
+        database_pool.release(self.LocalDBInterface)
+        return None
+
+def main(auto_test: bool = False):
+    if auto_test:
+        import doctest
+        doctest.testmod()
+        return None
+    import argparse
+    parser = argparse.ArgumentParser(description='Import or export pins, sources, subgroups and supergroups as CSV or JSON Lines.')
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('table', choices=get_args(TransferTable))
+    parser.add_argument('path', help='a .csv or .jsonl file')
+    arguments = parser.parse_args()
+    transfer = PinTransfer()
+    try:
+        if arguments.action == 'export':
+            print(f'Exported {transfer.export_rows(arguments.table, arguments.path)} rows')
+        else:
+            report: ImportReport = transfer.import_rows(arguments.table, arguments.path)
+            print(f'Imported {report["imported"]} rows, skipped {report["existing"]} already there, rejected {report["rejected"]}')
+            for error in report['errors']:
+                print(f'  row {error}')
+    finally:
+        transfer.close_connection()
+    return None
+
+if __name__ == '__main__':
+    logging.basicConfig(filename='pin_transfer.log', level=logging.INFO)
+    logger.info(f'{"begin log":{"-"}^40}')
+    try:
+        main()
+    except Exception as err:
+        logger.exception(f'Got exception on main handler: {err}')
+        raise
+    finally:
+        logger.info(f'{"end log":{"-"}^40}')